@@ -0,0 +1,59 @@
+"""
+Tests for parsing Team Cymru's bulk WHOIS responses.
+"""
+
+import pytest
+
+from whois_tool.resolvers.cymru_dns_resolver import parse_cymru_bulk_response
+
+# whois.cymru.com 'begin / verbose / 8.8.8.8 / 1.1.1.1 / 10.0.0.1 / bogus /
+# 2001:4860:4860:0::8888 / end'
+CYMRU_BULK = """Bulk mode; whois.cymru.com [2024-01-10 10:00:00 +0000]
+AS      | IP                                       | BGP Prefix          | CC | Registry | Allocated  | AS Name
+15169   | 8.8.8.8                                  | 8.8.8.0/24          | US | arin     | 2023-12-28 | GOOGLE, US
+13335   | 1.1.1.1                                  | 1.1.1.0/24          | AU | apnic    | 2011-08-11 | CLOUDFLARENET, US
+NA      | 10.0.0.1                                 | NA                  |    | other    |            | NA
+Error: no ASN or IP match on line 5.
+15169   | 2001:4860:4860::8888                     | 2001:4860::/32      | US | arin     | 2005-03-14 | GOOGLE, US
+"""
+
+
+@pytest.mark.parametrize('ip, expected', [
+    ('8.8.8.8', {
+        'ip': '8.8.8.8',
+        'asn': '15169',
+        'network': {'cidr': '8.8.8.0/24'},
+        'country': 'US',
+        'registered': '2023-12-28',
+        'org': 'GOOGLE, US',
+    }),
+    # The AS name can have commas and spaces but never splits further
+    ('1.1.1.1', {
+        'ip': '1.1.1.1',
+        'asn': '13335',
+        'network': {'cidr': '1.1.1.0/24'},
+        'country': 'AU',
+        'registered': '2011-08-11',
+        'org': 'CLOUDFLARENET, US',
+    }),
+    ('2001:4860:4860::8888', {
+        'ip': '2001:4860:4860::8888',
+        'asn': '15169',
+        'network': {'cidr': '2001:4860::/32'},
+        'country': 'US',
+        'registered': '2005-03-14',
+        'org': 'GOOGLE, US',
+    }),
+])
+def test_parse_cymru_bulk_response(ip, expected):
+    assert parse_cymru_bulk_response(CYMRU_BULK)[ip] == expected
+
+
+def test_parse_cymru_bulk_response_skips_unrouted_and_noise():
+    # Banner, headers, the error line and the unrouted 10.0.0.1 are all dropped
+    assert set(parse_cymru_bulk_response(CYMRU_BULK)) == {'8.8.8.8', '1.1.1.1', '2001:4860:4860::8888'}
+
+
+@pytest.mark.parametrize('output', ['', 'Bulk mode; whois.cymru.com [2024-01-10 10:00:00 +0000]\n'])
+def test_parse_cymru_bulk_response_empty(output):
+    assert parse_cymru_bulk_response(output) == {}
@@ -0,0 +1,62 @@
+"""
+Tests for the per-server token bucket.
+"""
+
+import pytest
+
+from whois_tool import ratelimit
+from whois_tool.ratelimit import ServerRateLimiter
+
+
+class FakeClock:
+    """Stands in for time.monotonic, moved forward by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', fake)
+    return fake
+
+
+@pytest.mark.parametrize('rate, burst, steps', [
+    # Burst of 2 goes straight through, then each request waits one
+    # token's worth longer than the last
+    (1.0, 2.0, [(0.0, 0.0), (0.0, 0.0), (0.0, 1.0), (0.0, 2.0)]),
+    # Tokens refill while we're idle, but never past the burst size - and
+    # waiting callers already hold the tokens that refill next
+    (2.0, 1.0, [(0.0, 0.0), (10.0, 0.0), (0.0, 0.5), (0.25, 0.75)]),
+    # Default burst is one second's worth
+    (4.0, None, [(0.0, 0.0)] * 4 + [(0.0, 0.25)]),
+])
+def test_reserve(clock, rate, burst, steps):
+    limiter = ServerRateLimiter(rate=rate, burst=burst)
+    for advance, expected_delay in steps:
+        clock.now += advance
+        assert limiter._reserve('whois.example.net') == pytest.approx(expected_delay)
+
+
+def test_reserve_keeps_servers_apart(clock):
+    limiter = ServerRateLimiter(rate=1.0, burst=1.0)
+    assert limiter._reserve('whois.arin.net') == 0.0
+    assert limiter._reserve('whois.ripe.net') == 0.0
+    assert limiter._reserve('whois.arin.net') == pytest.approx(1.0)
+
+
+def test_reserve_forgets_oldest_server(clock):
+    limiter = ServerRateLimiter(rate=1.0, burst=1.0, max_servers=1)
+    limiter._reserve('whois.arin.net')
+    limiter._reserve('whois.ripe.net')
+    # ARIN's bucket was evicted, so it starts full again
+    assert limiter._reserve('whois.arin.net') == 0.0
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        ServerRateLimiter(rate=0)
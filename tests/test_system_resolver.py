@@ -0,0 +1,199 @@
+"""
+Tests for the port 43 WHOIS parsing and referral helpers.
+"""
+
+import pytest
+
+from whois_tool.resolvers import system_resolver
+from whois_tool.resolvers.system_resolver import (
+    DEFAULT_WHOIS_SERVER, arin_referral, cached_whois_server, parse_whois_output, remember_whois_server
+)
+
+# whois.arin.net 'n + 8.8.8.8' - the covering /9 first, then Google's /24
+ARIN_8_8_8_8 = """
+#
+# ARIN WHOIS data and services are subject to the Terms of Use
+# available at: https://www.arin.net/resources/registry/whois/tou/
+#
+
+NetRange:       8.0.0.0 - 8.127.255.255
+CIDR:           8.0.0.0/9
+NetName:        LVLT-ORG-8-8
+NetHandle:      NET-8-0-0-0-1
+Parent:          ()
+NetType:        Direct Allocation
+OriginAS:       
+Organization:   Level 3 Parent, LLC (LPL-141)
+RegDate:        1992-12-01
+Updated:        2018-04-23
+Ref:            https://rdap.arin.net/registry/ip/8.0.0.0
+
+OrgName:        Level 3 Parent, LLC
+OrgId:          LPL-141
+Country:        US
+
+NetRange:       8.8.8.0 - 8.8.8.255
+CIDR:           8.8.8.0/24
+NetName:        GOGL
+NetHandle:      NET-8-8-8-0-2
+Parent:         LVLT-ORG-8-8 (NET-8-0-0-0-1)
+NetType:        Reallocated
+OriginAS:       
+Organization:   Google LLC (GOGL)
+RegDate:        2023-12-28
+Updated:        2023-12-28
+Ref:            https://rdap.arin.net/registry/ip/8.8.8.0
+
+OrgName:        Google LLC
+OrgId:          GOGL
+City:           Mountain View
+Country:        US
+
+#
+# ARIN WHOIS data and services are subject to the Terms of Use
+#
+"""
+
+# whois.ripe.net '193.0.6.139' - inetnum, then the route object
+RIPE_193_0_6_139 = """% This is the RIPE Database query service.
+% The objects are in RPSL format.
+%
+% The RIPE Database is subject to Terms and Conditions.
+% See https://docs.db.ripe.net/terms-conditions.html
+
+% Note: this output has been filtered.
+%       To receive output for a database update, use the "-B" flag.
+
+% Information related to '193.0.0.0 - 193.0.7.255'
+
+% Abuse contact for '193.0.0.0 - 193.0.7.255' is 'abuse@ripe.net'
+
+inetnum:        193.0.0.0 - 193.0.7.255
+netname:        RIPE-NCC
+descr:          RIPE Network Coordination Centre
+org:            ORG-RIEN1-RIPE
+descr:          Amsterdam, Netherlands
+remarks:        Used for RIPE NCC infrastructure.
+country:        NL
+admin-c:        BRD-RIPE
+tech-c:         OPS4-RIPE
+status:         ASSIGNED PA
+mnt-by:         RIPE-NCC-MNT
+created:        2003-03-17T12:15:57Z
+last-modified:  2017-12-04T14:42:31Z
+source:         RIPE
+
+% Information related to '193.0.0.0/21AS3333'
+
+route:          193.0.0.0/21
+descr:          RIPE-NCC
+origin:         AS3333
+mnt-by:         RIPE-NCC-MNT
+created:        2008-09-10T14:27:53Z
+last-modified:  2008-09-10T14:27:53Z
+source:         RIPE
+
+% This query was served by the RIPE Database Query Service version 1.112 (SHETLAND)
+"""
+
+# whois.arin.net for space ARIN handed over to RIPE
+ARIN_REFERRAL = """
+NetRange:       5.0.0.0 - 5.255.255.255
+CIDR:           5.0.0.0/8
+NetName:        5-RIPE
+NetType:        Allocated to RIPE NCC
+OriginAS:       
+Organization:   RIPE Network Coordination Centre (RIPE)
+RegDate:        2010-11-01
+ReferralServer: whois://whois.ripe.net
+ResourceLink:   https://apps.db.ripe.net/db-web-ui/query
+
+OrgName:        RIPE Network Coordination Centre
+Country:        NL
+"""
+
+# whois.iana.org '193.0.6.139'
+IANA_193 = """
+% IANA WHOIS server
+% for more information on IANA, visit http://www.iana.org
+% This query returned 1 object
+
+refer:        whois.ripe.net
+
+inetnum:      193.0.0.0 - 193.255.255.255
+organisation: RIPE NCC
+status:       ALLOCATED
+
+whois:        whois.ripe.net
+
+changed:      1993-05
+source:       IANA
+"""
+
+
+@pytest.fixture(autouse=True)
+def empty_referral_cache(monkeypatch):
+    """Every test starts without remembered IANA referrals"""
+    monkeypatch.setattr(system_resolver, '_referral_cache', {})
+
+
+@pytest.mark.parametrize('output, ip, expected', [
+    # Later lines win: Google's /24, not Level 3's /9. The empty OriginAS
+    # must not swallow the next line.
+    (ARIN_8_8_8_8, '8.8.8.8', {
+        'ip': '8.8.8.8',
+        'organization': 'Google LLC (GOGL)',
+        'country': 'US',
+        'network': '8.8.8.0/24',
+        'registered': '2023-12-28',
+    }),
+    # Comment lines never match, and the route object comes last
+    (RIPE_193_0_6_139, '193.0.6.139', {
+        'ip': '193.0.6.139',
+        'organization': 'RIPE-NCC',
+        'country': 'NL',
+        'asn': '3333',
+        'network': '193.0.0.0 - 193.0.7.255',
+        'registered': '2008-09-10T14:27:53Z',
+    }),
+    # CRLF line endings parse the same
+    (RIPE_193_0_6_139.replace('\n', '\r\n'), '193.0.6.139', {
+        'ip': '193.0.6.139',
+        'organization': 'RIPE-NCC',
+        'country': 'NL',
+        'asn': '3333',
+        'network': '193.0.0.0 - 193.0.7.255',
+        'registered': '2008-09-10T14:27:53Z',
+    }),
+    # Empty fields stay empty instead of taking the next line's value
+    ('Country:\nOrgName: Foo Inc\n', '192.0.2.1', {'ip': '192.0.2.1'}),
+    ('Country:\r\nCIDR: 192.0.2.0/24\r\n', '192.0.2.1', {'ip': '192.0.2.1', 'network': '192.0.2.0/24'}),
+    ('', '192.0.2.1', {'ip': '192.0.2.1'}),
+])
+def test_parse_whois_output(output, ip, expected):
+    assert parse_whois_output(output, ip) == expected
+
+
+@pytest.mark.parametrize('server, output, expected', [
+    ('whois.arin.net', ARIN_REFERRAL, 'whois.ripe.net'),
+    ('whois.arin.net', 'ReferralServer: whois://WHOIS.APNIC.NET:43\n', 'whois.apnic.net'),
+    # rwhois isn't followed, and neither is a referral back to the same server
+    ('whois.arin.net', 'ReferralServer: rwhois://rwhois.example.net:4321\n', None),
+    ('whois.arin.net', 'ReferralServer: whois://whois.arin.net\n', None),
+    ('whois.arin.net', ARIN_8_8_8_8, None),
+])
+def test_arin_referral(server, output, expected):
+    assert arin_referral(server, output) == expected
+
+
+@pytest.mark.parametrize('ip, iana_output, expected, same_block_ip', [
+    ('193.0.6.139', IANA_193, 'whois.ripe.net', '193.255.0.1'),
+    ('2001:db8::1', 'refer:        whois.apnic.net\n', 'whois.apnic.net', '2001:db8:ffff::1'),
+    # No referral - fall back to ARIN
+    ('192.0.2.1', '% IANA WHOIS server\n', DEFAULT_WHOIS_SERVER, '192.1.2.3'),
+])
+def test_remember_whois_server(ip, iana_output, expected, same_block_ip):
+    assert cached_whois_server(ip) is None
+    assert remember_whois_server(ip, iana_output) == expected
+    # One answer covers the whole IANA block
+    assert cached_whois_server(same_block_ip) == expected
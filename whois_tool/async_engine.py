@@ -0,0 +1,385 @@
+"""
+Async lookup path for IP WHOIS lookups.
+
+Talks RDAP over aiohttp, WHOIS over raw port 43 sockets and Team Cymru's
+origin-AS service over DNS, so a single event loop can keep hundreds of
+lookups in flight at once.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlsplit
+
+import aiohttp
+import dns.exception
+
+from .util import WhoisResult, normalize_whois_result, merge_whois_results, parse_ip
+from .ratelimit import ServerRateLimiter
+from .resolvers.system_resolver import (
+    parse_whois_output, IANA_WHOIS_SERVER, WHOIS_PORT, cached_whois_server, remember_whois_server,
+    whois_query, arin_referral, check_whois_response
+)
+from .resolvers.whois_pool import default_pool, is_pushback_error
+from .resolvers.cymru_dns_resolver import lookup_cymru_async, wrap_dns_error, CYMRU_ORIGIN_ZONES
+from .resolvers.base import TransientLookupError
+
+logger = logging.getLogger('whois_tool.async_engine')
+
+# ARIN redirects queries for other RIRs' space to the right RDAP server
+RDAP_BOOTSTRAP_URL = 'https://rdap.arin.net/registry/ip/{ip}'
+
+# Big RIR responses (ARIN nets with lots of sub-blocks) fit in one buffer,
+# so reading them takes a handful of big reads instead of many 64KB ones
+WHOIS_READ_BUFFER_SIZE = 1 << 20
+
+# Plenty for one RDAP server, and stops us opening hundreds of sockets to it
+RDAP_CONNECTIONS_PER_HOST = 32
+
+# Same default the system resolver uses
+DEFAULT_TIMEOUT = 30.0
+
+# Source names used in results - mirrors the resolver class names
+RDAP_SOURCE = 'AsyncRDAPClient'
+WHOIS_SOURCE = 'AsyncWhoisClient'
+CYMRU_SOURCE = 'AsyncCymruDNSClient'
+
+
+def create_session(concurrency: int, timeout: Optional[float] = None) -> aiohttp.ClientSession:
+    """
+    Create an HTTP session shared by every RDAP lookup in a batch.
+
+    Args:
+        concurrency: Maximum number of open connections
+        timeout: Total timeout per request in seconds (None for default)
+
+    Returns:
+        A new aiohttp client session
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=concurrency, limit_per_host=RDAP_CONNECTIONS_PER_HOST),
+        timeout=aiohttp.ClientTimeout(total=timeout or DEFAULT_TIMEOUT),
+        headers={'Accept': 'application/rdap+json, application/json'}
+    )
+
+
+def _vcard_name(entity: Dict[str, Any]) -> Optional[str]:
+    """Pull the formatted name out of an RDAP entity's vCard"""
+    vcard = entity.get('vcardArray')
+    if not vcard or len(vcard) < 2:
+        return None
+
+    for prop in vcard[1]:
+        if len(prop) >= 4 and prop[0] == 'fn':
+            return prop[3]
+
+    return None
+
+
+def parse_rdap_response(data: Dict[str, Any], ip: str) -> Dict[str, Any]:
+    """
+    Flatten an RDAP IP network object into the shape normalize_whois_result expects.
+
+    Args:
+        data: Decoded RDAP JSON response
+        ip: IP address that was looked up
+
+    Returns:
+        Raw WHOIS data as a dictionary
+    """
+    result: Dict[str, Any] = {'ip': ip, 'rdap': data}
+
+    # Network - prefer the CIDR extension, fall back to the address range
+    cidrs = []
+    for cidr in data.get('cidr0_cidrs') or []:
+        prefix = cidr.get('v4prefix') or cidr.get('v6prefix')
+        if prefix and 'length' in cidr:
+            cidrs.append(f"{prefix}/{cidr['length']}")
+
+    if cidrs:
+        result['network'] = {'cidr': ', '.join(cidrs)}
+    elif data.get('startAddress') and data.get('endAddress'):
+        result['network'] = {
+            'start_address': data['startAddress'],
+            'end_address': data['endAddress']
+        }
+
+    # Organization - registrant entity first, then the network name
+    for entity in data.get('entities') or []:
+        if 'registrant' in (entity.get('roles') or []):
+            name = _vcard_name(entity)
+            if name:
+                result['org'] = name
+                break
+    if 'org' not in result and data.get('name'):
+        result['org'] = data['name']
+
+    if data.get('country'):
+        result['country'] = data['country']
+
+    for event in data.get('events') or []:
+        if event.get('eventAction') == 'registration':
+            result['registered'] = event.get('eventDate')
+            break
+
+    # ARIN includes origin ASNs as an extension
+    origin_asns = data.get('arin_originas0_originautnums')
+    if origin_asns:
+        result['asn'] = str(origin_asns[0])
+
+    return result
+
+
+async def fetch_rdap(
+    session: aiohttp.ClientSession,
+    ip: str,
+    limiter: Optional[ServerRateLimiter] = None
+) -> Dict[str, Any]:
+    """
+    Look up an IP over RDAP.
+
+    Args:
+        session: Shared HTTP session
+        ip: IP address to look up
+        limiter: Optional per-server rate limiter
+
+    Returns:
+        Raw WHOIS data as a dictionary
+
+    Raises:
+        ValueError: If the lookup fails
+    """
+    url = RDAP_BOOTSTRAP_URL.format(ip=ip)
+
+    if limiter is not None:
+        await limiter.acquire(urlsplit(url).hostname)
+
+    try:
+        logger.debug(f"Performing async RDAP lookup for {ip}")
+        async with session.get(url) as resp:
+            if resp.status == 404:
+                raise ValueError(f"No RDAP record found for {ip}")
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+    except aiohttp.ClientResponseError as e:
+        # Throttling and server trouble pass; other 4xx answers won't change
+        if e.status == 429 or e.status >= 500:
+            raise TransientLookupError(f"RDAP lookup error: {e}")
+        raise ValueError(f"RDAP lookup error: {e}")
+    except aiohttp.ClientError as e:
+        raise TransientLookupError(f"RDAP lookup error: {e}")
+    except asyncio.TimeoutError:
+        raise TransientLookupError("Timeout expired for RDAP lookup")
+
+    return parse_rdap_response(data, ip)
+
+
+async def query_whois(
+    server: str,
+    query: str,
+    timeout: Optional[float] = None,
+    limiter: Optional[ServerRateLimiter] = None
+) -> str:
+    """
+    Send a single query to a WHOIS server on port 43.
+
+    Args:
+        server: WHOIS server hostname
+        query: Query string to send
+        timeout: Timeout in seconds (None for default)
+        limiter: Optional per-server rate limiter
+
+    Returns:
+        The server's response as text
+
+    Raises:
+        TransientLookupError: If the server can't be reached, times out or
+            is rate limiting us
+    """
+    timeout = timeout or DEFAULT_TIMEOUT
+
+    if limiter is not None:
+        await limiter.acquire(server)
+
+    # Back off together with the sync resolvers when the server pushes back
+    delay = default_pool.backoff_delay(server)
+    if delay > 0:
+        logger.debug(f"Backing off {server} for {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(server, WHOIS_PORT, limit=WHOIS_READ_BUFFER_SIZE), timeout
+        )
+    except asyncio.TimeoutError as e:
+        raise TransientLookupError(f"Couldn't connect to {server}: {e}")
+    except OSError as e:
+        if is_pushback_error(e):
+            default_pool.report_pushback(server)
+        raise TransientLookupError(f"Couldn't connect to {server}: {e}")
+
+    try:
+        writer.write(f"{query}\r\n".encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    except asyncio.TimeoutError:
+        raise TransientLookupError(f"Timeout expired for whois query to {server}")
+    except OSError as e:
+        if is_pushback_error(e):
+            default_pool.report_pushback(server)
+        raise TransientLookupError(f"Error querying {server}: {e}")
+    finally:
+        writer.close()
+        # Let the transport actually close, so the fd is released now rather
+        # than whenever the GC gets to it
+        try:
+            await asyncio.wait_for(writer.wait_closed(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            pass
+
+    return check_whois_response(server, data.decode('utf-8', errors='replace'))
+
+
+async def fetch_whois(
+    ip: str,
+    timeout: Optional[float] = None,
+    limiter: Optional[ServerRateLimiter] = None
+) -> Dict[str, Any]:
+    """
+    Look up an IP over port 43, following IANA's (and ARIN's) referral to the right RIR.
+
+    Args:
+        ip: IP address to look up
+        timeout: Timeout in seconds (None for default)
+        limiter: Optional per-server rate limiter
+
+    Returns:
+        Raw WHOIS data as a dictionary
+
+    Raises:
+        ValueError: If the lookup fails
+    """
+    logger.debug(f"Performing async WHOIS lookup for {ip}")
+
+    # Ask IANA who's in charge of this block (unless we already know)
+    server = cached_whois_server(ip)
+    if server is None:
+        server = remember_whois_server(ip, await query_whois(IANA_WHOIS_SERVER, ip, timeout, limiter))
+
+    output = await query_whois(server, whois_query(server, ip), timeout, limiter)
+
+    referred = arin_referral(server, output)
+    if referred:
+        logger.debug(f"{server} referred {ip} to {referred}")
+        server = referred
+        output = await query_whois(server, whois_query(server, ip), timeout, limiter)
+
+    if not output.strip():
+        raise ValueError(f"No output from {server}")
+
+    result = parse_whois_output(output, ip)
+    result['raw_output'] = output
+    return result
+
+
+async def fetch_origin_asn(
+    ip: str,
+    timeout: Optional[float] = None,
+    limiter: Optional[ServerRateLimiter] = None
+) -> Dict[str, Any]:
+    """
+    Look up an IP's origin AS and AS name through Team Cymru's DNS interface.
+    
+    Args:
+        ip: IP address to look up
+        timeout: Timeout in seconds (None for default)
+        limiter: Optional per-server rate limiter
+        
+    Returns:
+        Raw WHOIS data as a dictionary
+        
+    Raises:
+        ValueError: If the lookup fails
+    """
+    if limiter is not None:
+        await limiter.acquire(CYMRU_ORIGIN_ZONES[parse_ip(ip).version])
+    
+    try:
+        logger.debug(f"Performing async Cymru DNS lookup for {ip}")
+        return await lookup_cymru_async(ip, timeout)
+    except dns.exception.DNSException as e:
+        raise wrap_dns_error(e)
+
+
+async def lookup_ip_async(
+    ip: str,
+    session: aiohttp.ClientSession,
+    method: str = 'auto',
+    timeout: Optional[float] = None,
+    limiter: Optional[ServerRateLimiter] = None
+) -> WhoisResult:
+    """
+    Look up WHOIS information for an IP address without blocking a thread.
+
+    In auto mode RDAP and port 43 are queried concurrently and merged, the
+    same way the sync engine merges results from every resolver. Team Cymru's
+    DNS service is asked alongside them and only fills in fields (usually
+    the ASN) that the registries left empty.
+
+    Args:
+        ip: IP address to look up
+        session: Shared HTTP session for RDAP
+        method: Lookup method (auto, ipwhois, system, cymru)
+        timeout: Timeout in seconds (None for default)
+        limiter: Optional per-server rate limiter
+
+    Returns:
+        Normalized WHOIS information
+
+    Raises:
+        TransientLookupError: If every lookup failed and at least one might
+            succeed on a retry
+        ValueError: If the method is not supported or every lookup failed for good
+    """
+    lookups = []
+    if method in ('auto', 'ipwhois'):
+        lookups.append((RDAP_SOURCE, fetch_rdap(session, ip, limiter)))
+    if method in ('auto', 'system'):
+        lookups.append((WHOIS_SOURCE, fetch_whois(ip, timeout, limiter)))
+    if method == 'cymru':
+        lookups.append((CYMRU_SOURCE, fetch_origin_asn(ip, timeout, limiter)))
+
+    if not lookups:
+        raise ValueError(f"Lookup method '{method}' has no async implementation")
+
+    # ipwhois gets the origin AS from Cymru too. It only fills gaps, so it
+    # doesn't count as a success on its own.
+    extras = []
+    if method in ('auto', 'ipwhois'):
+        extras.append((CYMRU_SOURCE, fetch_origin_asn(ip, timeout, limiter)))
+
+    raw_results = await asyncio.gather(*(coro for _, coro in lookups + extras), return_exceptions=True)
+
+    results: List[WhoisResult] = []
+    errors = []
+    transient = False
+    for (source, _), raw in zip(lookups, raw_results):
+        if isinstance(raw, Exception):
+            errors.append(f"{source}: {raw}")
+            transient = transient or isinstance(raw, TransientLookupError)
+            logger.warning(f"{source} failed on {ip}: {raw}")
+            continue
+        results.append(normalize_whois_result(raw, source))
+
+    if not results:
+        # Worth retrying as long as one of the failures might clear up
+        error_type = TransientLookupError if transient else ValueError
+        raise error_type(f"All lookup methods failed for {ip}: {'; '.join(errors)}")
+
+    for (source, _), raw in zip(extras, raw_results[len(lookups):]):
+        if isinstance(raw, Exception):
+            logger.debug(f"{source} failed on {ip}: {raw}")
+            continue
+        results.append(normalize_whois_result(raw, source))
+
+    return merge_whois_results(results) if len(results) > 1 else results[0]
@@ -0,0 +1,97 @@
+"""
+Bounded-concurrency batch runner for port 43 WHOIS lookups.
+
+A lighter alternative to WhoisEngine.process_ips_async for callers that
+just want WHOIS records for a list of IPs: no cache, no RDAP, no merging.
+Lookups run on one event loop with at most `concurrency` in flight, and
+every server is held to `rate` queries per `interval`.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional, Union
+
+from .async_engine import fetch_whois, WHOIS_SOURCE
+from .ratelimit import ServerRateLimiter
+from .util import WhoisResult, filter_valid_ips, normalize_whois_result
+
+logger = logging.getLogger('whois_tool.async_runner')
+
+# Most IPs run_batch will take in one call before refusing - a queue this
+# long would take hours at RIR rate limits anyway
+DEFAULT_MAX_QUEUE = 100_000
+
+
+async def lookup_batch_async(
+    ips: List[str],
+    concurrency: int = 8,
+    limiter: Optional[ServerRateLimiter] = None,
+    timeout: Optional[float] = None
+) -> List[Union[WhoisResult, Exception]]:
+    """
+    Look up WHOIS records for many IPs with bounded concurrency.
+
+    Args:
+        ips: Valid IP addresses to look up
+        concurrency: Maximum number of lookups in flight at once
+        limiter: Optional per-server rate limiter
+        timeout: Timeout in seconds per query (None for default)
+
+    Returns:
+        Normalized WHOIS information for each IP, in order - or the
+        exception its lookup failed with
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(ip: str) -> WhoisResult:
+        async with semaphore:
+            raw = await fetch_whois(ip, timeout, limiter)
+        return normalize_whois_result(raw, WHOIS_SOURCE)
+
+    return await asyncio.gather(*(bounded(ip) for ip in ips), return_exceptions=True)
+
+
+def run_batch(
+    ips: List[str],
+    concurrency: int = 8,
+    rate: float = 10.0,
+    interval: float = 1.0,
+    timeout: Optional[float] = None,
+    max_queue: int = DEFAULT_MAX_QUEUE
+) -> List[Union[WhoisResult, Exception]]:
+    """
+    Look up WHOIS records for a batch of IPs from synchronous code.
+
+    Invalid IPs are dropped (and logged) the same way filter_valid_ips does,
+    so the results line up with filter_valid_ips(ips).
+
+    Args:
+        ips: IP addresses to look up
+        concurrency: Maximum number of lookups in flight at once
+        rate: Queries allowed per server per interval
+        interval: Length of the rate limit interval in seconds
+        timeout: Timeout in seconds per query (None for default)
+        max_queue: Refuse batches with more valid IPs than this
+
+    Returns:
+        Normalized WHOIS information for each valid IP, in order - or the
+        exception its lookup failed with
+
+    Raises:
+        ValueError: If the batch is bigger than max_queue, or the limits
+            aren't positive
+    """
+    if concurrency < 1 or rate <= 0 or interval <= 0:
+        raise ValueError("concurrency, rate and interval must be positive")
+
+    valid_ips = filter_valid_ips(ips)
+    if len(valid_ips) > max_queue:
+        raise ValueError(f"Batch of {len(valid_ips)} IPs is over the limit of {max_queue}")
+    if not valid_ips:
+        return []
+
+    # Bucket holds one interval's worth, refilled at rate/interval per second
+    limiter = ServerRateLimiter(rate=rate / interval, burst=rate)
+
+    logger.info(f"Running WHOIS batch of {len(valid_ips)} IPs ({concurrency} at a time, {rate} per {interval}s per server)")
+    return asyncio.run(lookup_batch_async(valid_ips, concurrency, limiter, timeout))
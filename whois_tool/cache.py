@@ -5,159 +5,658 @@ This helps us stay within rate limits and speeds up repeat lookups.
 """
 
 import os
-import json
 import time
+import queue
+import atexit
+import sqlite3
 import logging
-from datetime import datetime, timedelta
+import threading
+import ipaddress
+import weakref
+from collections import OrderedDict
 
-# How long to keep cache entries (24 hours by default)
-DEFAULT_TTL = 86400  
+from .util import parse_ip, json_dumps, json_loads
+
+# Registry data changes over weeks to months, not hours. Entries younger
+# than DEFAULT_TTL (10 days) are served as-is. Older ones are looked up again,
+# but kept until DEFAULT_STALE_TTL (30 days) as a fallback in case that
+# lookup fails.
+DEFAULT_TTL = 10 * 86400
+DEFAULT_STALE_TTL = 30 * 86400
+
+# Everything lives in one SQLite file inside the cache dir
+CACHE_DB_NAME = 'cache.db'
+
+# Hot entries kept in memory in front of the database
+DEFAULT_MEM_ENTRIES = 8192
+
+# Results are also indexed by the network they cover, so other IPs in the
+# same block get answered without a lookup. Big allocations are often carved
+# up between different owners, so only blocks at least this specific count.
+NETWORK_REUSE_MIN_PREFIX = {4: 24, 6: 48}
+DEFAULT_MEM_NETWORKS = 4096
+
+# Parts of a result that describe the query rather than the network, left
+# out when it's handed to another IP in the same block
+_NEIGHBOUR_ONLY = ('raw', 'raw_output', 'reused_from')
+
+# Writes are queued and committed in batches by a background thread -
+# whichever comes first of this many entries or this many seconds
+WRITE_BATCH_SIZE = 100
+WRITE_BATCH_INTERVAL = 0.25
+
+# Small resolver-level caches (reverse DNS) that should outlive the process
+# share one database in the user's cache dir, a table each. Expired rows are
+# deleted every PURGE_EVERY inserts rather than checked on every one.
+USER_CACHE_DB_NAME = 'cache.sqlite'
+PURGE_EVERY = 1000
 
 # Get logger but don't be too formal about it
 log = logging.getLogger('whois_tool.cache')
 
+# Every PersistentTTLCache, so clearing the disk can clear their memory too
+_persistent_caches = weakref.WeakSet()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    ip TEXT NOT NULL,
+    method TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    result BLOB NOT NULL,
+    PRIMARY KEY (ip, method)
+);
+CREATE INDEX IF NOT EXISTS idx_cache_timestamp ON cache (timestamp);
+"""
+
+
+class TTLCache:
+    """
+    Small thread-safe in-memory cache where every entry expires on its own.
+
+    Entries are re-inserted on every set, so the dict is kept in (roughly)
+    expiry order and trimming only ever looks at the front - no O(n)
+    sweeps, however full it gets.
+    """
+
+    def __init__(self, max_entries):
+        self._entries = {}  # key -> (value, expiry on the monotonic clock)
+        self._max = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if it's missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[1]:
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds"""
+        now = time.monotonic()
+        entries = self._entries
+        with self._lock:
+            entries.pop(key, None)
+            entries[key] = (value, now + ttl)
+
+            # Drop expired entries from the front, and the oldest if we're full
+            while entries:
+                oldest = next(iter(entries))
+                if len(entries) <= self._max and entries[oldest][1] > now:
+                    break
+                del entries[oldest]
+
+    def pop(self, key):
+        """Forget key, if it's there"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Forget everything"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MISSING = object()
+
+
+def user_cache_dir():
+    """Per-user cache dir: $XDG_CACHE_HOME/whois_tool, or ~/.cache/whois_tool"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'whois_tool')
+
+
+def clean_persistent_caches(everything=False):
+    """
+    Delete expired PersistentTTLCache rows from disk - or all of them.
+
+    Goes through every table in the user cache database, not just the
+    caches this process happened to create.
+
+    Returns:
+        Number of rows deleted
+    """
+    if everything:
+        for cache in list(_persistent_caches):
+            TTLCache.clear(cache)
+
+    db_path = os.path.join(user_cache_dir(), USER_CACHE_DB_NAME)
+    if not os.path.exists(db_path):
+        return 0
+
+    cleaned = 0
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                if everything:
+                    cleaned += conn.execute(f"DELETE FROM {table}").rowcount
+                else:
+                    cleaned += conn.execute(f"DELETE FROM {table} WHERE expires <= ?", (time.time(),)).rowcount
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log.warning(f"Couldn't clean {db_path}: {e}")
+    return cleaned
+
+
+class PersistentTTLCache(TTLCache):
+    """
+    TTLCache that also keeps its entries in SQLite, so they survive between runs.
+
+    Keys are stored as strings and values go through JSON, so stick to
+    JSON-friendly types. The database is only opened on first use, and if
+    that fails the cache just carries on in memory.
+    """
+
+    def __init__(self, table, max_entries, db_path=None):
+        super().__init__(max_entries)
+        self.table = table
+        self.db_path = db_path or os.path.join(user_cache_dir(), USER_CACHE_DB_NAME)
+        self._conn = None
+        self._opened = False
+        self._inserts = 0
+        self._db_lock = threading.Lock()
+        _persistent_caches.add(self)
+
+    def _db(self):
+        """Get the database connection, opening it the first time - None if we can't"""
+        # Caller must hold self._db_lock
+        if not self._opened:
+            self._opened = True
+            try:
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+                conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} "
+                    "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+                )
+                self._conn = conn
+            except (OSError, sqlite3.Error) as e:
+                log.warning(f"Couldn't open {self.db_path}, {self.table} cache won't persist: {e}")
+        return self._conn
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if it's missing or expired"""
+        value = super().get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return default
+            try:
+                row = conn.execute(f"SELECT value, expires FROM {self.table} WHERE key = ?", (str(key),)).fetchone()
+            except sqlite3.Error as e:
+                log.warning(f"Couldn't read {self.table} cache: {e}")
+                return default
+
+        if row is None:
+            return default
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return default
+
+        # Keep it in memory for the rest of its life
+        value = json_loads(row[0])
+        super().set(key, value, remaining)
+        return value
+
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds"""
+        super().set(key, value, ttl)
+        if ttl <= 0:
+            return
+
+        try:
+            blob = json_dumps(value)
+        except (TypeError, ValueError) as e:
+            log.debug(f"Not persisting {self.table} entry for {key}: {e}")
+            return
+
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                    (str(key), blob, time.time() + ttl)
+                )
+                self._inserts += 1
+                if self._inserts % PURGE_EVERY == 0:
+                    self._purge(conn)
+            except sqlite3.Error as e:
+                log.warning(f"Couldn't write {self.table} cache: {e}")
+
+    def _purge(self, conn):
+        """Delete expired rows, returning how many went"""
+        # Caller must hold self._db_lock
+        return conn.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (time.time(),)).rowcount
+
+    def purge_expired(self):
+        """Delete expired rows from the database"""
+        with self._db_lock:
+            conn = self._db()
+            if conn is None:
+                return 0
+            try:
+                return self._purge(conn)
+            except sqlite3.Error as e:
+                log.warning(f"Couldn't clean {self.table} cache: {e}")
+                return 0
+
+    def pop(self, key):
+        """Forget key, if it's there"""
+        super().pop(key)
+        with self._db_lock:
+            conn = self._db()
+            if conn is not None:
+                try:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (str(key),))
+                except sqlite3.Error as e:
+                    log.warning(f"Couldn't write {self.table} cache: {e}")
+
+    def clear(self):
+        """Forget everything, on disk too"""
+        super().clear()
+        with self._db_lock:
+            conn = self._db()
+            if conn is not None:
+                try:
+                    conn.execute(f"DELETE FROM {self.table}")
+                except sqlite3.Error as e:
+                    log.warning(f"Couldn't clear {self.table} cache: {e}")
+
 
 class CacheManager:
-    """Handles caching of WHOIS results to disk"""
-    
-    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL):
+    """Handles caching of WHOIS results in a SQLite database"""
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, mem_size=DEFAULT_MEM_ENTRIES, stale_ttl=DEFAULT_STALE_TTL):
         # Use default location if none specified
         if not cache_dir:
             # Go up one dir from this file, then into data/cache
             cache_dir = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache')
-        
+
         self.cache_dir = cache_dir
         self.ttl = ttl
-        
+        # Never throw entries away before they stop being fresh
+        self.stale_ttl = max(ttl, stale_ttl)
+        self.db_path = os.path.join(cache_dir, CACHE_DB_NAME)
+
+        # One connection shared by all worker threads, so serialize access
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # (ip, method) -> (timestamp, result), least recently used first.
+        # Repeat IPs (log files!) get answered without touching the database.
+        self._mem = OrderedDict()
+        self._mem_max = mem_size
+
+        # (method, network) -> (timestamp, result), same LRU scheme. Only in
+        # memory - the database stays keyed by IP.
+        self._nets = OrderedDict()
+        self._nets_max = DEFAULT_MEM_NETWORKS
+        # (version, prefixlen) pairs present in _nets, to try longest first
+        self._net_prefixes = set()
+
         # Make sure the cache dir exists
         try:
             os.makedirs(cache_dir, exist_ok=True)
-            log.debug(f"Cache initialized at {cache_dir}")
         except Exception as e:
             # Don't crash if we can't create it, just warn
             log.warning(f"Couldn't create cache directory: {e}")
+            return
 
-    def _get_cache_path(self, ip, method):
-        """Get the path to the cache file for an IP+method combo"""
-        # Replace colons with underscores for IPv6 support
-        ip = ip.replace(':', '_')
-        return os.path.join(self.cache_dir, f"{ip}_{method}.json")
+        try:
+            # Autocommit mode - every statement is its own tiny transaction
+            self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            log.debug(f"Cache initialized at {self.db_path}")
+        except sqlite3.Error as e:
+            # Run without a cache rather than failing the whole lookup
+            log.warning(f"Couldn't open cache database: {e}")
+            self._conn = None
+            return
 
-    def get(self, ip, method):
-        """Check if we have a fresh result for this IP"""
+        # Lookups hand results to the writer thread and move on, so they
+        # never wait on the database. Readers still see pending writes
+        # through the memory layer.
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name='cache-writer', daemon=True)
+        self._writer.start()
+
+        # Don't lose queued writes when the process exits
+        atexit.register(self.close)
+
+    def _write_loop(self):
+        """Background thread: commit queued entries in batches"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + WRITE_BATCH_INTERVAL
+
+            # Grab whatever else shows up before the deadline
+            while len(batch) < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # A dead writer would leave flush() waiting forever
+                log.error(f"Couldn't write {len(batch)} cache entries: {e}")
+
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        """Write a batch of (ip, method, timestamp, result) in one transaction"""
+        rows = []
+        for ip, method, timestamp, result in batch:
+            try:
+                rows.append((ip, method, timestamp, json_dumps(result)))
+            except Exception as e:
+                log.warning(f"Couldn't cache result for {ip}: {e}")
+
+        if not rows:
+            return
+
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (ip, method, timestamp, result) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                # Log but don't crash if caching fails
+                log.warning(f"Couldn't write {len(rows)} cache entries: {e}")
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+
+    def _remember(self, key, timestamp, result):
+        """Put an entry in the memory layer, evicting the oldest if full"""
+        # Caller must hold self._lock
+        self._mem[key] = (timestamp, result)
+        self._mem.move_to_end(key)
+        if len(self._mem) > self._mem_max:
+            self._mem.popitem(last=False)
+
+    def _remember_network(self, method, timestamp, result):
+        """Index a result by the network(s) it says it covers"""
+        # Caller must hold self._lock
+        network = result.get('network')
+        if not isinstance(network, str):
+            return
+
+        # ARIN lists several CIDRs for one net, comma separated
+        for cidr in network.split(','):
+            try:
+                net = ipaddress.ip_network(cidr.strip(), strict=False)
+            except ValueError:
+                # Ranges like 'a.b.c.d-e.f.g.h' aren't worth the trouble
+                continue
+            if net.prefixlen < NETWORK_REUSE_MIN_PREFIX[net.version]:
+                continue
+
+            key = (method, net)
+            self._nets[key] = (timestamp, result)
+            self._nets.move_to_end(key)
+            self._net_prefixes.add((net.version, net.prefixlen))
+            if len(self._nets) > self._nets_max:
+                self._nets.popitem(last=False)
+
+    def _get_network_entry(self, ip, method, now, cutoff):
+        """Find a result for a network containing ip, most specific first"""
         try:
-            cache_file = self._get_cache_path(ip, method)
-            
-            # No cached data yet
-            if not os.path.exists(cache_file):
-                return None
-                
-            with open(cache_file) as f:
-                data = json.load(f)
-                
-            # Check if it's too old - using a slightly different approach
-            # than elsewhere for variety
-            age = time.time() - data.get('timestamp', 0)
-            if age > self.ttl:
-                # Too old, don't use it
-                log.debug(f"Cache for {ip} is stale ({age:.1f} sec old)")
+            addr = parse_ip(ip)
+        except ValueError:
+            return None
+
+        with self._lock:
+            prefixes = sorted(
+                (prefixlen for version, prefixlen in self._net_prefixes if version == addr.version),
+                reverse=True
+            )
+            for prefixlen in prefixes:
+                key = (method, ipaddress.ip_network((addr, prefixlen), strict=False))
+                entry = self._nets.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= cutoff:
+                    del self._nets[key]
+                    continue
+                self._nets.move_to_end(key)
+                # Same registry data, but it's this IP's result now. The raw
+                # response was for the other IP, so it stays behind.
+                result = {k: v for k, v in entry[1].items() if k not in _NEIGHBOUR_ONLY}
+                result['ip'] = ip
+                result['reused_from'] = entry[1].get('ip')
+                return result, now - entry[0]
+
+        return None
+
+    def get_entry(self, ip, method):
+        """
+        Look up a result along with how old it is.
+
+        Returns (result, age in seconds) for anything younger than
+        stale_ttl, or None. Callers decide what to do with stale entries.
+        IPs that were never looked up themselves can still get a result
+        from another IP in the same small network.
+        """
+        now = time.time()
+        cutoff = now - self.stale_ttl
+
+        entry = self._get_ip_entry(ip, method, now, cutoff)
+        if entry is None:
+            entry = self._get_network_entry(ip, method, now, cutoff)
+        return entry
+
+    def _get_ip_entry(self, ip, method, now, cutoff):
+        """Exact-match half of get_entry: memory, then the database"""
+        key = (ip, method)
+
+        # Memory first - no SQL, no JSON decoding
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > cutoff:
+                    self._mem.move_to_end(key)
+                    return entry[1], now - entry[0]
+                del self._mem[key]
+
+        if self._conn is None:
+            return None
+
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT timestamp, result FROM cache WHERE ip = ? AND method = ? AND timestamp > ?",
+                    (ip, method, cutoff)
+                ).fetchone()
+
+            # Nothing cached, or it's too old
+            if row is None:
                 return None
-                
-            # Found it and it's fresh
-            return data.get('result')
-            
-        except json.JSONDecodeError:
-            # Corrupted cache file
-            log.warning(f"Corrupt cache file for {ip}, ignoring")
+
+            result = json_loads(row[1])
+            with self._lock:
+                self._remember(key, row[0], result)
+            return result, now - row[0]
+
+        except ValueError:
+            # Corrupted cache entry
+            log.warning(f"Corrupt cache entry for {ip}, ignoring")
             return None
         except Exception as e:
             # Something else went wrong, log it but don't crash
             log.warning(f"Cache read failed: {e}")
             return None
 
+    def get(self, ip, method):
+        """Check if we have a fresh result for this IP"""
+        entry = self.get_entry(ip, method)
+        if entry is None or entry[1] >= self.ttl:
+            return None
+        return entry[0]
+
     def set(self, ip, method, result):
         """Save a result for later"""
         # Don't try to cache None
         if result is None:
             return False
-            
-        try:
-            cache_file = self._get_cache_path(ip, method)
-            
-            data = {
-                'timestamp': time.time(),
-                'result': result
-            }
-            
-            # Write to a temp file first to avoid corruption if interrupted
-            temp_file = cache_file + ".tmp"
-            with open(temp_file, 'w') as f:
-                json.dump(data, f)
-            
-            # Rename is atomic on most filesystems
-            os.replace(temp_file, cache_file)
-            return True
-                
-        except Exception as e:
-            # Log but don't crash if caching fails
-            log.warning(f"Couldn't cache result for {ip}: {e}")
+
+        now = time.time()
+        with self._lock:
+            self._remember((ip, method), now, result)
+            self._remember_network(method, now, result)
+
+        if self._conn is None:
             return False
 
-    def clean_expired(self):
-        """Clean up old cache entries"""
+        # The writer thread does the encoding and the actual insert
+        self._queue.put((ip, method, now, result))
+        return True
+
+    def flush(self):
+        """Wait until every queued write has reached the database"""
+        if self._conn is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def _clean_legacy_files(self, cutoff):
+        """
+        Remove expired per-IP JSON files left behind by the old file cache.
+
+        The file mtime is the write time, so one stat per entry is enough -
+        no need to open and parse anything.
+        """
         cleaned = 0
-        now = time.time()
-        
-        # Don't crash if cache dir doesn't exist
-        if not os.path.exists(self.cache_dir):
-            return 0
-        
+
         try:
-            files = os.listdir(self.cache_dir)
-        except Exception as e:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                            cleaned += 1
+                    except OSError as e:
+                        log.warning(f"Error checking cache file {entry.name}: {e}")
+        except OSError as e:
             log.error(f"Couldn't list cache directory: {e}")
-            return 0
-            
-        # Process each JSON file in the cache dir
-        for filename in files:
-            # Skip non-JSON files that might be in there
-            if not filename.endswith('.json'):
-                continue
-                
-            # Also skip temp files from in-progress writes
-            if filename.endswith('.tmp'):
-                continue
-                
-            full_path = os.path.join(self.cache_dir, filename)
-            
+
+        return cleaned
+
+    def clean_expired(self):
+        """Clean up cache entries too old to use even as a fallback"""
+        cutoff = time.time() - self.stale_ttl
+        cleaned = self._clean_legacy_files(cutoff)
+
+        if self._conn is not None:
             try:
-                # Check if this file is too old
-                with open(full_path) as f:
-                    data = json.load(f)
-                    
-                if now - data.get('timestamp', 0) > self.ttl:
-                    # It's old, delete it
-                    os.remove(full_path)
-                    cleaned += 1
-                    
-            except (json.JSONDecodeError, KeyError):
-                # File is corrupt, might as well delete it
-                try:
-                    os.remove(full_path)
-                    cleaned += 1
-                    log.debug(f"Deleted corrupt cache file: {filename}")
-                except:
-                    pass
-            except Exception as e:
-                # Something else went wrong, just log it
-                log.warning(f"Error checking cache file {filename}: {e}")
-        
+                with self._lock:
+                    cursor = self._conn.execute(
+                        "DELETE FROM cache WHERE timestamp < ?",
+                        (cutoff,)
+                    )
+                cleaned += cursor.rowcount
+            except sqlite3.Error as e:
+                log.error(f"Couldn't clean cache: {e}")
+
+        # Reverse DNS answers and the like, kept in the user cache dir
+        cleaned += clean_persistent_caches()
+
         if cleaned > 0:
             log.info(f"Cleaned {cleaned} expired cache entries")
         return cleaned
-        
-    # Maybe we'll add these later? Left as stub for now
+
     def clear(self, ip=None):
         """Clear specific or all cache entries"""
-        # TODO: Implement this when needed
-        pass
+        with self._lock:
+            if ip is None:
+                self._mem.clear()
+                self._nets.clear()
+                self._net_prefixes.clear()
+            else:
+                for key in [k for k in self._mem if k[0] == ip]:
+                    del self._mem[key]
+                for key in [k for k, v in self._nets.items() if v[1].get('ip') == ip]:
+                    del self._nets[key]
+
+        if ip is None:
+            clean_persistent_caches(everything=True)
+
+        if self._conn is None:
+            return
+
+        # Otherwise queued writes would bring cleared entries back
+        self.flush()
+
+        with self._lock:
+            if ip is None:
+                self._conn.execute("DELETE FROM cache")
+            else:
+                self._conn.execute("DELETE FROM cache WHERE ip = ?", (ip,))
+
+    def close(self):
+        """Write out anything queued, then close the database connection"""
+        if self._conn is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        atexit.unregister(self.close)
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -7,19 +7,71 @@ Handles command-line arguments, sets up logging, and runs the lookup process.
 import sys
 import os
 import argparse
+import asyncio
 import logging
-from typing import List, Optional
+import queue
+import threading
+import concurrent.futures
+from functools import lru_cache
+from typing import Callable, Iterator, TypeVar
 
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
 
 from whois_tool import __version__
 from whois_tool.engine import WhoisEngine
+from whois_tool.ratelimit import ServerRateLimiter, DEFAULT_SERVER_RATE
 from whois_tool.output import render_console, write_output
+from whois_tool.util import canonical_ip, iter_unique_ips
 from whois_tool.resolvers import get_available_resolvers
 
 console = Console()
 
+# Log records are written to disk in chunks this big
+LOG_BUFFER_SIZE = 64 * 1024
+
+# Read IP files in big chunks - matters for million-line inputs
+IP_FILE_BUFFER_SIZE = 128 * 1024
+
+# How often the progress bar picks up finished lookups, in seconds
+PROGRESS_POLL_INTERVAL = 0.05
+
+T = TypeVar('T')
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that doesn't flush after every record.
+    
+    Records collect in a 64KB buffer and hit the disk in big writes. Errors
+    still flush straight away so they survive a crash, and logging flushes
+    everything on shutdown at exit.
+    """
+    
+    _defer_flush = False
+    
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=LOG_BUFFER_SIZE,
+            encoding=self.encoding,
+            errors=getattr(self, 'errors', None)
+        )
+    
+    def emit(self, record):
+        # Handler lock is held here, so the flag can't race
+        self._defer_flush = record.levelno < logging.ERROR
+        try:
+            super().emit(record)
+        finally:
+            self._defer_flush = False
+    
+    def flush(self):
+        if not self._defer_flush:
+            super().flush()
+
+
 def setup_logging(verbose=False):
     """Sets up logging - file always, console only in verbose mode"""
     log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'logs')
@@ -35,7 +87,7 @@ def setup_logging(verbose=False):
         root_logger.setLevel(logging.INFO)
     
     # Always log to file
-    fh = logging.FileHandler(log_file)
+    fh = BufferedFileHandler(log_file)
     fh.setLevel(logging.DEBUG)  # Debug to file regardless of console level
     fh.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
     root_logger.addHandler(fh)
@@ -51,8 +103,9 @@ def setup_logging(verbose=False):
         logging.debug("Verbose logging enabled")
 
 
-def parse_args(args=None):
-    """Parses command line args and returns the parsed namespace"""
+@lru_cache(maxsize=1)
+def _build_parser():
+    """Builds the argument parser (once - it never changes between calls)"""
     parser = argparse.ArgumentParser(
         description="IP WHOIS Lookup Tool - Look up WHOIS information for IP addresses",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -92,14 +145,14 @@ def parse_args(args=None):
     lookup_group = parser.add_argument_group('Lookup Options')
     lookup_group.add_argument(
         '--lookup-method',
-        choices=['auto', 'ipwhois', 'pythonwhois', 'system'],
+        choices=['auto', 'cymru', 'ipwhois', 'pythonwhois', 'system'],
         default='auto',
         help='WHOIS lookup method'
     )
     lookup_group.add_argument(
         '--force-system-whois',
         action='store_true',
-        help='Force use of system whois command'
+        help='Force use of the port 43 WHOIS resolver (same as --lookup-method system)'
     )
     lookup_group.add_argument(
         '--no-cache',
@@ -116,7 +169,13 @@ def parse_args(args=None):
         '--rate-limit',
         type=float,
         default=1.0,
-        help='Minimum time between requests in seconds'
+        help='Average time between requests to each server in seconds, with short bursts allowed (used when --server-rate-limit is 0)'
+    )
+    lookup_group.add_argument(
+        '--server-rate-limit',
+        type=float,
+        default=DEFAULT_SERVER_RATE,
+        help='Maximum requests per second to each WHOIS/RDAP server (0 to use --rate-limit instead)'
     )
     
     # Performance options
@@ -126,11 +185,21 @@ def parse_args(args=None):
         action='store_true',
         help='Disable parallel processing'
     )
+    perf_group.add_argument(
+        '--threaded',
+        action='store_true',
+        help='Run parallel lookups on a thread pool (--max-workers threads) instead of the async engine'
+    )
     perf_group.add_argument(
         '--max-workers',
         type=int,
         default=8,
-        help='Maximum number of worker threads for parallel processing'
+        help='Parallelism factor - up to 50x this many lookups are kept in flight at once'
+    )
+    perf_group.add_argument(
+        '--adaptive-workers',
+        action='store_true',
+        help='Ramp up lookups in flight while throughput improves and back off when rate limited (--max-workers still sets the cap)'
     )
     
     # Other options
@@ -147,7 +216,12 @@ def parse_args(args=None):
         help='Show version information and exit'
     )
     
-    # Parse arguments
+    return parser
+
+
+def parse_args(args=None):
+    """Parses command line args and returns the parsed namespace"""
+    parser = _build_parser()
     parsed_args = parser.parse_args(args)
     
     # Handle force-system-whois
@@ -161,33 +235,117 @@ def parse_args(args=None):
     return parsed_args
 
 
-def get_ip_addresses(args: argparse.Namespace) -> List[str]:
+def iter_ip_addresses(args: argparse.Namespace) -> Iterator[str]:
     """
-    Get IP addresses from command-line arguments or file.
+    Lazily yield IP addresses from command-line arguments and file.
+    
+    The file is streamed with a large read buffer, so huge IP lists never
+    have to fit in memory and lookups can start before the file is read.
+    Anything after a '#' is treated as a comment.
     
     Args:
         args: Parsed command-line arguments
         
-    Returns:
-        List of IP addresses
+    Yields:
+        IP address strings
+        
+    Raises:
+        OSError: If the IP file can't be read
     """
-    ips = []
-    
     # Get IPs from command-line
     if args.ip:
-        ips.extend(args.ip)
+        yield from args.ip
     
     # Get IPs from file
     if args.file:
+        with open(args.file, 'r', buffering=IP_FILE_BUFFER_SIZE) as f:
+            for line in f:
+                ip = line.split('#', 1)[0].strip()
+                if ip:
+                    yield ip
+
+
+def count_ip_addresses(args: argparse.Namespace) -> int:
+    """
+    Count the unique, valid IP addresses we're going to look up.
+    
+    This pre-pass sizes the progress bar and is where invalid and duplicate
+    entries get reported, so the lookup pass can drop them quietly.
+    
+    Args:
+        args: Parsed command-line arguments
+        
+    Returns:
+        Number of unique valid IP addresses
+    """
+    seen = set()
+    invalid = 0
+    duplicates = 0
+    
+    try:
+        for ip in iter_ip_addresses(args):
+            canonical = canonical_ip(ip)
+            if canonical is None:
+                logging.warning(f"Skipping invalid IP address: {ip}")
+                invalid += 1
+            elif canonical in seen:
+                duplicates += 1
+            else:
+                seen.add(canonical)
+    except OSError as e:
+        console.print(f"[bold red]Error reading IP file:[/] {e}")
+        sys.exit(1)
+    
+    if invalid or duplicates:
+        console.print(f"Skipping {invalid} invalid and {duplicates} duplicate IP addresses")
+    
+    return len(seen)
+
+
+def run_with_progress(work: Callable[[Callable[[int], None]], T], advance: Callable[[int], None]) -> T:
+    """
+    Run a batch of lookups in a background thread, reporting progress from this one.
+    
+    The lookups only drop completion counts on a queue. This thread drains
+    it every PROGRESS_POLL_INTERVAL seconds and passes the total to advance,
+    so Rich is only ever touched from one thread, a few times a second.
+    
+    Args:
+        work: Function that runs the lookups, given a progress callback
+        advance: Called with the number of IPs finished since the last call
+        
+    Returns:
+        Whatever work returns (its exceptions are re-raised here)
+    """
+    done_q = queue.SimpleQueue()
+    future = concurrent.futures.Future()
+    
+    def runner():
         try:
-            with open(args.file, 'r') as f:
-                file_ips = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-                ips.extend(file_ips)
-        except Exception as e:
-            console.print(f"[bold red]Error reading IP file:[/] {e}")
-            sys.exit(1)
+            future.set_result(work(done_q.put_nowait))
+        except BaseException as e:
+            future.set_exception(e)
     
-    return ips
+    # Daemon thread, so Ctrl+C doesn't have to wait for in-flight lookups
+    threading.Thread(target=runner, name='lookups', daemon=True).start()
+    
+    while True:
+        # Sleep out the interval, or less if the work finishes first
+        concurrent.futures.wait([future], timeout=PROGRESS_POLL_INTERVAL)
+        
+        # Check before draining - anything queued before the work finished gets picked up
+        finished = future.done()
+        count = 0
+        try:
+            while True:
+                count += done_q.get_nowait()
+        except queue.Empty:
+            pass
+        
+        if count:
+            advance(count)
+        if finished:
+            return future.result()
 
 
 def main(argv=None):
@@ -215,7 +373,9 @@ def main(argv=None):
             lookup_method=args.lookup_method,
             use_cache=not args.no_cache,
             timeout=args.timeout,
-            rate_limit=args.rate_limit
+            rate_limit=args.rate_limit,
+            limiter=ServerRateLimiter(args.server_rate_limit) if args.server_rate_limit > 0 else None,
+            http_pool_size=args.max_workers
         )
         
         # Clean cache if requested
@@ -225,13 +385,14 @@ def main(argv=None):
             console.print(f"Cleaned {cleaned} expired cache entries")
         
         # Get IP addresses
-        ips = get_ip_addresses(args)
+        total = count_ip_addresses(args)
         
-        if not ips:
+        if not total:
             console.print("[bold red]Error:[/] No IP addresses provided")
             return 1
         
-        console.print(f"Processing {len(ips)} IP addresses...")
+        console.print(f"Processing {total} IP addresses...")
+        ips = iter_unique_ips(iter_ip_addresses(args))
         
         # Process IP addresses
         with Progress(
@@ -239,26 +400,42 @@ def main(argv=None):
             TextColumn("[bold blue]{task.description}"),
             BarColumn(),
             TextColumn("[bold]{task.completed}/{task.total}"),
-            TimeRemainingColumn()
+            TimeRemainingColumn(),
+            console=console,
+            # A few redraws a second is plenty, and nothing at all when
+            # output is piped - update() is then a no-op
+            refresh_per_second=4,
+            disable=not console.is_terminal
         ) as progress:
-            task_id = progress.add_task("Looking up IP addresses...", total=len(ips))
+            task_id = progress.add_task("Looking up IP addresses...", total=total)
             
-            # Monkey patch the progress reporting into the engine
-            original_lookup = engine.lookup_ip
+            def advance(n):
+                progress.update(task_id, advance=n)
             
-            def lookup_with_progress(ip):
-                result = original_lookup(ip)
-                progress.update(task_id, advance=1)
-                return result
-            
-            engine.lookup_ip = lookup_with_progress
+            if args.no_parallel:
+                # Plain sequential lookups - handy for debugging
+                def work(progress_cb):
+                    return engine.process_ips(ips, parallel=False, progress_cb=progress_cb)
+            elif args.threaded:
+                # The old thread pool engine - uses the sync resolvers
+                def work(progress_cb):
+                    return engine.process_ips(
+                        ips,
+                        max_workers=args.max_workers,
+                        progress_cb=progress_cb,
+                        adaptive=args.adaptive_workers
+                    )
+            else:
+                # One event loop keeps lots of lookups in flight at once
+                def work(progress_cb):
+                    return asyncio.run(engine.process_ips_async(
+                        ips,
+                        concurrency=args.max_workers * 50,
+                        progress_cb=progress_cb,
+                        adaptive=args.adaptive_workers
+                    ))
             
-            # Process IPs
-            results = engine.process_ips(
-                ips,
-                parallel=not args.no_parallel,
-                max_workers=args.max_workers
-            )
+            results = run_with_progress(work, advance)
         
         # Show what we found (or didn't)
         if not results:
@@ -4,19 +4,118 @@ Core engine for IP WHOIS lookups.
 Handles the orchestration of lookups, caching, and fallback mechanisms.
 """
 
+import asyncio
+import itertools
 import logging
+import threading
 import time
 import concurrent.futures
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Callable
 
-from .util import WhoisResult, filter_valid_ips, merge_whois_results
+from .util import (
+    RESULT_FIELDS, WhoisResult, filter_valid_ips, is_valid_ip, is_public_ip, merge_whois_results,
+    normalize_whois_result
+)
 from .cache import CacheManager
 from .resolvers import get_resolver_by_method, BaseResolver
-
-# TODO: Add async support in the future
+from .resolvers.base import TransientLookupError, retry_delay, DEFAULT_RATE_LIMIT_BURST
+from .ratelimit import ServerRateLimiter
+from .async_engine import create_session, lookup_ip_async
+from .http_session import create_http_session, DEFAULT_POOL_SIZE
 
 logger = logging.getLogger('whois_tool.engine')
 
+# Parallel runs report progress in batches to keep lock traffic down
+PROGRESS_BATCH_SIZE = 16
+
+# IPs per call for resolvers that can look up many at once
+LOOKUP_BATCH_SIZE = 256
+
+# Auto mode stops asking resolvers once every output field is filled in...
+AUTO_COMPLETE_FIELDS = tuple(field for field in RESULT_FIELDS if field != 'source')
+# ...or once Cymru plus a registry have answered with the network and
+# registration date, which is as good as it usually gets (city is rare)
+AUTO_ENOUGH_FIELDS = ('network', 'registered')
+AUTO_ENOUGH_RESULTS = 2
+
+# Adaptive worker sizing: start here, re-check throughput every interval,
+# double while it keeps growing, halve (down to the floor) when throttled
+ADAPTIVE_START_WORKERS = 32
+ADAPTIVE_MIN_WORKERS = 4
+ADAPTIVE_MAX_WORKERS = 512
+ADAPTIVE_INTERVAL = 5.0
+ADAPTIVE_GROWTH = 1.1
+
+
+def _auto_has_enough(merged, result_count):
+    """Whether auto mode can skip the rest of the resolvers"""
+    if all(merged.get(field) for field in AUTO_COMPLETE_FIELDS):
+        return True
+    return result_count >= AUTO_ENOUGH_RESULTS and all(merged.get(field) for field in AUTO_ENOUGH_FIELDS)
+
+
+def _is_rate_limited(error):
+    """Guess whether a lookup failed because a server is throttling us"""
+    # Resolvers wrap everything in ValueError, so the message is all we have
+    msg = str(error).lower()
+    return '429' in msg or 'rate limit' in msg or 'too many requests' in msg
+
+
+def _synthesize_private_result(ip):
+    """Result for an address no registry has anything on (private, reserved...)"""
+    result = normalize_whois_result({'ip': ip}, 'local')
+    result['organization'] = 'Private'
+    return result
+
+
+class AdaptiveWorkers:
+    """
+    Picks how many lookups to keep in flight based on observed throughput.
+    
+    Doubles the worker count while completions per second keep growing by
+    more than 10%, and halves it whenever a server starts rate limiting us.
+    Never goes above the cap the caller asked for.
+    """
+    
+    def __init__(self, cap, start=ADAPTIVE_START_WORKERS, interval=ADAPTIVE_INTERVAL):
+        self.cap = max(1, min(cap, ADAPTIVE_MAX_WORKERS))
+        self.workers = min(start, self.cap)
+        self.interval = interval
+        
+        self._window_start = time.monotonic()
+        self._completed = 0
+        self._last_rate = None
+        self._last_backoff = float('-inf')
+    
+    def record(self, throttled=False):
+        """Note one finished lookup and adjust the worker count if it's time"""
+        now = time.monotonic()
+        
+        if throttled:
+            # Back off at most once per window - a burst of 429s is one signal
+            if now - self._last_backoff >= self.interval:
+                self.workers = max(min(ADAPTIVE_MIN_WORKERS, self.cap), self.workers // 2)
+                self._last_backoff = now
+                self._window_start = now
+                self._completed = 0
+                logger.info(f"Rate limited - dropping to {self.workers} workers")
+            return
+        
+        self._completed += 1
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return
+        
+        rate = self._completed / elapsed
+        if self._last_rate is None or rate > self._last_rate * ADAPTIVE_GROWTH:
+            if self.workers < self.cap:
+                self.workers = min(self.workers * 2, self.cap)
+                logger.info(f"Throughput up to {rate:.1f} IPs/s - raising to {self.workers} workers")
+        
+        self._last_rate = rate
+        self._window_start = now
+        self._completed = 0
+
 
 class WhoisEngine:
     """Main engine that coordinates WHOIS lookups and caching"""
@@ -27,7 +126,9 @@ class WhoisEngine:
         use_cache=True,
         timeout=None,
         rate_limit=1.0,
-        max_retries=2
+        max_retries=2,
+        limiter=None,
+        http_pool_size=DEFAULT_POOL_SIZE
     ):
         """Sets up the engine with the given configuration"""
         self.lookup_method = lookup_method
@@ -36,6 +137,31 @@ class WhoisEngine:
         self.rate_limit = rate_limit
         self.max_retries = max_retries
         
+        # Per-server token buckets shared by every resolver and the async path.
+        # Without one, resolvers fall back to their own rate_limit bucket.
+        self.limiter = limiter
+        
+        # The async path doesn't go through the resolvers, so without a shared
+        # limiter it gets per-server buckets at the rate_limit pace instead -
+        # otherwise turning off --server-rate-limit would turn off throttling
+        self.async_limiter = limiter
+        if limiter is None and rate_limit > 0:
+            self.async_limiter = ServerRateLimiter(rate=1.0 / rate_limit, burst=DEFAULT_RATE_LIMIT_BURST)
+        
+        # One keep-alive HTTP session for every RDAP request this engine makes,
+        # so lookups don't each pay for a fresh TCP + TLS handshake
+        self.http_session = create_http_session(http_pool_size)
+        
+        # Resolvers are built on first use and then reused for every lookup,
+        # so their sessions and rate limit state actually stick around
+        self._resolvers = None
+        self._resolvers_lock = threading.Lock()
+        
+        # Lookups currently running, by IP - a second thread asking for the
+        # same IP waits for the first one instead of hitting the server again
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._inflight_lock = threading.Lock()
+        
         # Cache manager - only initialize if caching is enabled
         # (saves memory and prevents unnecessary directory creation)
         self.cache = None
@@ -44,30 +170,114 @@ class WhoisEngine:
         
         # Log config at startup - helps with debugging
         logger.debug(f"Engine started: {lookup_method=}, {use_cache=}, {timeout=}")
-        
-        # FIXME: Currently using a fixed rate limit for all resolvers
-        # Should probably be configurable per resolver type
+    
+    def _get_resolvers(self) -> List[BaseResolver]:
+        """Build the resolvers for our lookup method once, then hand out the same ones"""
+        if self._resolvers is None:
+            with self._resolvers_lock:
+                if self._resolvers is None:
+                    resolvers = get_resolver_by_method(
+                        self.lookup_method,
+                        rate_limit=self.rate_limit,
+                        limiter=self.limiter,
+                        session=self.http_session
+                    )
+                    if not isinstance(resolvers, list):
+                        resolvers = [resolvers]  # Make sure we have a list to iterate
+                    # --no-cache means fresh answers (and nothing on disk) from
+                    # the resolvers' own caches too
+                    for resolver in resolvers:
+                        resolver.configure_cache(self.use_cache)
+                    self._resolvers = resolvers
+        return self._resolvers
+    
+    def _get_cached(self, ip):
+        """Return the cached result for an IP, or None if there isn't one"""
+        if self.use_cache and self.cache:
+            return self.cache.get(ip, self.lookup_method)
+        return None
+    
+    def _get_stale(self, ip, error):
+        """
+        Fall back to an expired-but-not-too-old cache entry after a failed
+        lookup. Re-raises the error if there's nothing to fall back on.
+        """
+        if self.use_cache and self.cache:
+            entry = self.cache.get_entry(ip, self.lookup_method)
+            if entry is not None:
+                result, age = entry
+                logger.warning(f"Lookup failed for {ip}, using cached result from {age / 86400:.1f} days ago: {error}")
+                return result
+        raise error
+    
+    def _get_known(self, ip):
+        """Answer an IP without a lookup if we can - private ranges, then cache"""
+        if not is_public_ip(ip):
+            return _synthesize_private_result(ip)
+        return self._get_cached(ip)
     
     def lookup_ip(self, ip):
         """Look up WHOIS info for a single IP address"""
+        # RFC1918 and friends would only fail after a round trip
+        if not is_public_ip(ip):
+            logger.debug(f"{ip} is private/reserved, skipping lookup")
+            return _synthesize_private_result(ip)
+        
         # First check if we've seen this IP before
-        if self.use_cache and self.cache:
-            cached = self.cache.get(ip, self.lookup_method)
-            if cached:
-                logger.debug(f"Found {ip} in cache 🎯")
-                return cached
+        cached = self._get_cached(ip)
+        if cached is not None:
+            logger.debug(f"Found {ip} in cache 🎯")
+            return cached
             
-        # Didn't find it in cache, need to do the lookup
+        # Someone else already looking this one up? Just wait for them
+        with self._inflight_lock:
+            future = self._inflight.get(ip)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._inflight[ip] = future
+        
+        if not owner:
+            logger.debug(f"{ip} is already being looked up, waiting for it")
+            return future.result()
+        
+        try:
+            result = self._lookup_uncached(ip)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[ip]
+    
+    def _lookup_uncached(self, ip):
+        """The part of lookup_ip that actually goes out to the resolvers"""
+        # Didn't find it in cache (or it's getting old), need to do the lookup
         logger.debug(f"Cache miss for {ip}, looking it up")
         
+        try:
+            final_result = self._resolve(ip)
+        except ValueError as e:
+            # Old data beats no data
+            return self._get_stale(ip, e)
+        
+        # Save for next time
+        if self.use_cache and self.cache:
+            self.cache.set(ip, self.lookup_method, final_result)
+        
+        return final_result
+    
+    def _resolve(self, ip):
+        """Run the resolvers for an IP and merge what comes back"""
         # Get the right resolver(s)
-        resolvers = get_resolver_by_method(self.lookup_method, rate_limit=self.rate_limit)
-        if not isinstance(resolvers, list):
-            resolvers = [resolvers]  # Make sure we have a list to iterate
+        resolvers = self._get_resolvers()
             
         # Will store our successes and failures here
         results = []
         errors = []
+        merged = None
         
         # Try resolvers until we get a hit
         for resolver in resolvers:
@@ -80,6 +290,12 @@ class WhoisEngine:
                 # In non-auto mode, we only try one resolver
                 if self.lookup_method != 'auto':
                     break
+                
+                # In auto mode, stop as soon as we've got what we need
+                merged = merge_whois_results(results) if len(results) > 1 else result
+                if _auto_has_enough(merged, len(results)):
+                    logger.debug(f"Got enough for {ip} after {resolver.name}, skipping the rest")
+                    break
                     
             except ValueError as e:
                 # Something went wrong, log it and maybe try another resolver
@@ -99,7 +315,10 @@ class WhoisEngine:
             raise ValueError(f"All lookup methods failed for {ip}")
         
         # We might have multiple results to combine
-        if len(results) > 1:
+        if merged is not None:
+            # Auto mode already merged as it went
+            final_result = merged
+        elif len(results) > 1:
             # This happens in auto mode when multiple resolvers work
             logger.debug(f"Got {len(results)} results for {ip}, merging them")
             final_result = merge_whois_results(results)
@@ -107,14 +326,28 @@ class WhoisEngine:
             # Just one result, use it directly
             final_result = results[0]
         
-        # Save for next time
-        if self.use_cache and self.cache:
-            self.cache.set(ip, self.lookup_method, final_result)
-        
         return final_result
     
-    def process_ips(self, ips, parallel=True, max_workers=8):
-        """Process multiple IP addresses, with optional parallelization"""
+    def process_ips(
+        self,
+        ips,
+        parallel=True,
+        max_workers=8,
+        progress_cb: Optional[Callable[[int], None]] = None,
+        adaptive=False
+    ):
+        """
+        Process multiple IP addresses, with optional parallelization.
+        
+        progress_cb, if given, is called with the number of IPs finished
+        since the last call - every IP in sequential mode, every
+        PROGRESS_BATCH_SIZE IPs in parallel mode.
+        
+        With adaptive=True the number of lookups in flight is tuned on the
+        fly (see AdaptiveWorkers), with max_workers as the ceiling.
+        
+        Each distinct IP is looked up once; repeats get the same result.
+        """
         # Make sure we only process valid IPs
         valid_ips = filter_valid_ips(ips)
         
@@ -123,44 +356,282 @@ class WhoisEngine:
             logger.warning("Found no valid IPs to process!")
             return []
         
+        # Log files repeat the same IPs a lot - no need to ask twice
+        unique_ips = list(dict.fromkeys(valid_ips))
+        if progress_cb and len(unique_ips) < len(valid_ips):
+            progress_cb(len(valid_ips) - len(unique_ips))
+        
         # Let us know what we're doing
-        mode = "parallel" if parallel and len(valid_ips) > 1 else "sequential"
-        logger.info(f"Processing {len(valid_ips)} IPs in {mode} mode")
+        mode = "parallel" if parallel and len(unique_ips) > 1 else "sequential"
+        logger.info(f"Processing {len(unique_ips)} unique IPs in {mode} mode")
         
-        results = []
+        found = {}  # IP -> result
         errors = []  # Keep track of failures
         
         # Process differently based on parallel flag
-        if parallel and len(valid_ips) > 1:
+        if parallel and len(unique_ips) > 1:
+            # Cache hits and private IPs are answered right here - a thread
+            # hand-off per IP costs far more than the work it would be doing
+            misses = []
+            hits = 0
+            for ip in unique_ips:
+                cached = self._get_known(ip)
+                if cached is not None:
+                    found[ip] = cached
+                    hits += 1
+                else:
+                    misses.append(ip)
+            
+            if hits:
+                logger.debug(f"Answered {hits} IPs locally without the thread pool")
+                if progress_cb:
+                    progress_cb(hits)
+            
+            # With adaptive sizing max_workers is only the upper bound
+            sizer = AdaptiveWorkers(max_workers) if adaptive else None
+            batch_resolver = self._get_batch_resolver()
+            
             # Fancy concurrent processing for multiple IPs
             with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Map IPs to futures
-                futures = {}
-                for ip in valid_ips:
-                    futures[executor.submit(self.lookup_ip, ip)] = ip
+                if batch_resolver:
+                    # The resolver does its own concurrency - one call per
+                    # chunk beats a thread hand-off per IP
+                    sizer = None
+                    outcomes = self._iter_batches(batch_resolver, misses)
+                elif sizer:
+                    outcomes = self._iter_adaptive(executor, misses, sizer)
+                else:
+                    # Fixed pool size - map streams results back without
+                    # any per-IP future bookkeeping on our side
+                    outcomes = executor.map(self._safe_lookup, misses)
                 
-                # Collect results as they finish
-                for future in concurrent.futures.as_completed(futures):
-                    ip = futures[future]
-                    try:
-                        # Get the result or exception
-                        result = future.result()
-                        results.append(result)
-                    except Exception as e:
+                done = 0
+                for ip, outcome in outcomes:
+                    throttled = False
+                    if isinstance(outcome, Exception):
                         # Something went wrong with this IP
-                        errors.append((ip, str(e)))
-                        logger.error(f"Couldn't look up {ip}: {e}")
+                        errors.append((ip, str(outcome)))
+                        logger.error(f"Couldn't look up {ip}: {outcome}")
+                        throttled = _is_rate_limited(outcome)
+                    else:
+                        found[ip] = outcome
+                    
+                    if sizer:
+                        sizer.record(throttled)
+                    
+                    done += 1
+                    if progress_cb and done >= PROGRESS_BATCH_SIZE:
+                        progress_cb(done)
+                        done = 0
+                
+                if progress_cb and done:
+                    progress_cb(done)
         else:
             # Simple sequential processing - good for small batches
             # or when debugging threading issues
-            for ip in valid_ips:
+            for ip in unique_ips:
                 try:
-                    result = self.lookup_ip(ip)
-                    results.append(result)
+                    found[ip] = self.lookup_ip(ip)
                 except Exception as e:
                     errors.append((ip, str(e)))
                     logger.error(f"Failed to process {ip}: {e}")
+                
+                if progress_cb:
+                    progress_cb(1)
+        
+        # One result per input IP, duplicates included, in input order
+        results = [found[ip] for ip in valid_ips if ip in found]
+        
+        self._log_summary(results, errors)
+        return results
+    
+    def _get_batch_resolver(self):
+        """The resolver to hand whole batches to, or None to go IP by IP"""
+        # Auto mode merges several resolvers per IP, so it stays per-IP
+        if self.lookup_method == 'auto':
+            return None
+        resolvers = self._get_resolvers()
+        if len(resolvers) == 1 and resolvers[0].supports_batch:
+            return resolvers[0]
+        return None
+    
+    def _iter_batches(self, resolver, ips):
+        """
+        Look up ips LOOKUP_BATCH_SIZE at a time with resolver.lookup_batch.
         
+        Yields (ip, result or exception) like _safe_lookup, with the same
+        caching and stale fallback as lookup_ip.
+        """
+        for start in range(0, len(ips), LOOKUP_BATCH_SIZE):
+            chunk = ips[start:start + LOOKUP_BATCH_SIZE]
+            outcomes = resolver.lookup_batch(chunk, self.timeout, self.max_retries)
+            
+            for ip, outcome in zip(chunk, outcomes):
+                if isinstance(outcome, Exception):
+                    try:
+                        outcome = self._get_stale(ip, outcome)
+                    except ValueError as e:
+                        outcome = e
+                elif self.use_cache and self.cache:
+                    self.cache.set(ip, self.lookup_method, outcome)
+                yield ip, outcome
+    
+    def _safe_lookup(self, ip):
+        """lookup_ip for worker threads - returns (ip, result or the exception)"""
+        try:
+            return ip, self.lookup_ip(ip)
+        except Exception as e:
+            return ip, e
+    
+    def _iter_adaptive(self, executor, ips, sizer):
+        """
+        Run lookups on executor, keeping sizer.workers of them in flight.
+        
+        Yields (ip, result or exception) as lookups finish. The caller feeds
+        each outcome to sizer.record, which may change the worker count
+        before the next top-up.
+        """
+        pending = set()
+        remaining = iter(ips)
+        
+        while True:
+            # Top up to the current worker count
+            for ip in itertools.islice(remaining, max(0, sizer.workers - len(pending))):
+                pending.add(executor.submit(self._safe_lookup, ip))
+            
+            if not pending:
+                return
+            
+            finished, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                yield future.result()
+    
+    async def _lookup_ip_async(self, ip, session):
+        """Async version of lookup_ip - same caching, no blocked thread"""
+        if not is_public_ip(ip):
+            return _synthesize_private_result(ip)
+        
+        # python-whois has no async API, so just run the sync lookup in a thread
+        if self.lookup_method == 'pythonwhois':
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.lookup_ip, ip)
+        
+        cached = self._get_cached(ip)
+        if cached is not None:
+            logger.debug(f"Found {ip} in cache 🎯")
+            return cached
+        
+        # Same retry policy as BaseResolver.lookup - only transient failures,
+        # with jittered backoff
+        retry_count = 0
+        while True:
+            try:
+                result = await lookup_ip_async(
+                    ip, session, self.lookup_method, self.timeout, self.async_limiter
+                )
+                break
+            except TransientLookupError as e:
+                retry_count += 1
+                if retry_count > self.max_retries:
+                    return self._get_stale(ip, e)
+                logger.warning(f"Async lookup failed for {ip}: {e}. Retrying ({retry_count}/{self.max_retries})...")
+                await asyncio.sleep(retry_delay(retry_count))
+            except ValueError as e:
+                return self._get_stale(ip, e)
+        
+        if self.use_cache and self.cache:
+            self.cache.set(ip, self.lookup_method, result)
+        
+        return result
+    
+    async def process_ips_async(self, ips, concurrency=400, progress_cb=None, adaptive=False):
+        """
+        Process multiple IP addresses on a single event loop.
+        
+        IPs are pulled from the iterable only as lookup slots free up, so a
+        generator over a huge file is consumed lazily. Each distinct IP is
+        looked up once; repeats get the same result.
+        
+        Args:
+            ips: IP addresses to look up (any iterable)
+            concurrency: Maximum number of lookups in flight at once
+            progress_cb: Optional callback, called with the number of IPs finished
+            adaptive: Tune the number of lookups in flight, up to concurrency
+            
+        Returns:
+            List of WHOIS results for the IPs that could be looked up
+        """
+        logger.info(f"Processing IPs in async mode ({concurrency=})")
+        
+        found = {}  # IP -> result
+        requested = []  # Every valid IP, repeats included
+        seen = set()
+        errors = []
+        pending = set()
+        dispatched = 0
+        sizer = AdaptiveWorkers(concurrency) if adaptive else None
+        
+        # A counter plus an event rather than a semaphore, since the
+        # adaptive limit can move while lookups are in flight
+        in_flight = 0
+        slot_free = asyncio.Event()
+        
+        async with create_session(concurrency, self.timeout) as session:
+            async def bounded_lookup(ip):
+                nonlocal in_flight
+                throttled = False
+                try:
+                    found[ip] = await self._lookup_ip_async(ip, session)
+                except Exception as e:
+                    errors.append((ip, str(e)))
+                    logger.error(f"Couldn't look up {ip}: {e}")
+                    throttled = _is_rate_limited(e)
+                finally:
+                    in_flight -= 1
+                    slot_free.set()
+                if sizer:
+                    sizer.record(throttled)
+                if progress_cb:
+                    progress_cb(1)
+            
+            for ip in ips:
+                if not is_valid_ip(ip):
+                    logger.warning(f"Skipping invalid IP address: {ip}")
+                    continue
+                
+                requested.append(ip)
+                if ip in seen:
+                    # Already looked up (or on its way)
+                    if progress_cb:
+                        progress_cb(1)
+                    continue
+                seen.add(ip)
+                
+                # Wait for a free slot before reading the next IP
+                while in_flight >= (sizer.workers if sizer else concurrency):
+                    slot_free.clear()
+                    await slot_free.wait()
+                in_flight += 1
+                task = asyncio.ensure_future(bounded_lookup(ip))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                dispatched += 1
+            
+            if pending:
+                await asyncio.gather(*pending)
+        
+        if not dispatched:
+            logger.warning("Found no valid IPs to process!")
+        
+        results = [found[ip] for ip in requested if ip in found]
+        
+        self._log_summary(results, errors)
+        return results
+    
+    def _log_summary(self, results, errors):
+        """Log how a batch went"""
         # Print a little summary
         if results:
             logger.info(f"Successfully processed {len(results)} IPs")
@@ -177,8 +648,6 @@ class WhoisEngine:
             else:
                 # Don't list them all if there are too many
                 logger.warning(f"Failed to process {err_count} IPs")
-        
-        return results
     
     def clean_cache(self) -> int:
         """
@@ -0,0 +1,138 @@
+"""
+Shared HTTP session for the sync resolvers.
+
+ipwhois talks to RDAP servers through a urllib opener, which opens a fresh
+TCP + TLS connection for every request. Routing those requests through one
+pooled requests.Session lets back-to-back lookups reuse kept-alive
+connections instead of paying for a new handshake each time.
+"""
+
+import io
+import logging
+import threading
+import urllib.request
+from typing import Optional
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.response import addinfourl
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import ServerRateLimiter
+
+logger = logging.getLogger('whois_tool.http_session')
+
+# Enough for the default thread pool plus a few redirects to other RIRs
+DEFAULT_POOL_SIZE = 8
+
+# Hosts to keep pools for - the five RIRs plus ARIN's redirects fit easily
+POOL_HOSTS = 32
+
+# Session for resolvers created without one (e.g. straight from get_resolver)
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def create_http_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Create an HTTP session with a connection pool sized for the worker count.
+
+    Args:
+        pool_size: Number of worker threads that will share the session
+
+    Returns:
+        A new requests session
+    """
+    session = requests.Session()
+    # No retries here - ipwhois and BaseResolver.lookup already retry, and
+    # stacking a third layer on top just multiplies the wait on a dead server
+    adapter = HTTPAdapter(
+        pool_connections=POOL_HOSTS,
+        pool_maxsize=pool_size * 4,
+        max_retries=0
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_shared_session() -> requests.Session:
+    """
+    Get the process-wide default session, creating it on first use.
+
+    Returns:
+        A requests session shared by everything that didn't bring its own
+    """
+    global _shared_session
+
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_http_session()
+        return _shared_session
+
+
+class SessionHandler(urllib.request.BaseHandler):
+    """
+    urllib handler that sends requests through a requests.Session.
+
+    Runs ahead of the stock HTTP(S) handlers, so anything that takes a urllib
+    opener (like ipwhois' proxy_opener) gets connection pooling for free -
+    and, given a limiter, a rate limit per host it actually talks to
+    (ARIN's bootstrap and every RIR it redirects to).
+    """
+
+    handler_order = 400
+
+    def __init__(self, session: requests.Session, limiter: Optional[ServerRateLimiter] = None):
+        self.session = session
+        self.limiter = limiter
+
+    def _open(self, req: urllib.request.Request) -> addinfourl:
+        timeout = req.timeout
+        if timeout is not None and not isinstance(timeout, (int, float)):
+            # urllib's "no timeout given" sentinel
+            timeout = None
+
+        if self.limiter is not None:
+            self.limiter.wait(urlsplit(req.full_url).hostname or '')
+
+        try:
+            resp = self.session.request(
+                req.get_method(),
+                req.full_url,
+                data=req.data,
+                headers=dict(req.header_items()),
+                timeout=timeout
+            )
+        except requests.RequestException as e:
+            # Callers expect urllib errors, so keep them happy
+            raise URLError(e)
+
+        result = addinfourl(io.BytesIO(resp.content), resp.headers, resp.url, resp.status_code)
+        # HTTPErrorProcessor turns 4xx/5xx into HTTPError using these
+        result.msg = resp.reason
+        return result
+
+    def http_open(self, req):
+        return self._open(req)
+
+    def https_open(self, req):
+        return self._open(req)
+
+
+def build_opener(
+    session: requests.Session,
+    limiter: Optional[ServerRateLimiter] = None
+) -> urllib.request.OpenerDirector:
+    """
+    Build a urllib opener backed by a shared session.
+
+    Args:
+        session: Session to send requests through
+        limiter: Optional per-host rate limiter every request waits on
+
+    Returns:
+        An opener suitable for ipwhois' proxy_opener argument
+    """
+    return urllib.request.build_opener(SessionHandler(session, limiter))
@@ -6,17 +6,15 @@ in various formats.
 """
 
 import os
-import json
 import logging
 import csv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 
-import pandas as pd
 from rich.console import Console
 from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 
-from .util import WhoisResult
+from .util import WhoisResult, json_dumps
 
 # Get logger
 logger = logging.getLogger('whois_tool.output')
@@ -24,6 +22,19 @@ logger = logging.getLogger('whois_tool.output')
 # Initialize console for rich output
 console = Console()
 
+# Above this many rows render_console prints a plain aligned table instead of
+# a rich one - rich styles and wraps every cell, which gets slow for big runs
+CONSOLE_PLAIN_TABLE_ROWS = 1000
+
+# Columns written by write_csv, in order
+CSV_FIELDS = ['ip', 'organization', 'country', 'city', 'asn', 'network', 'registered', 'source']
+
+
+def _rows(results: Iterable[WhoisResult], fields: List[str]) -> Iterator[tuple]:
+    """Walk the results once, as tuples of the given fields (None where missing)"""
+    for result in results:
+        yield tuple(result.get(field) for field in fields)
+
 
 def render_console(results: List[WhoisResult], verbose: bool = False) -> None:
     """
@@ -37,52 +48,49 @@ def render_console(results: List[WhoisResult], verbose: bool = False) -> None:
         console.print("[yellow]No results to display[/]")
         return
     
-    # Create table
-    table = Table(title="IP WHOIS Lookup Results")
-    
-    # Add columns
-    table.add_column("IP Address", style="cyan")
-    table.add_column("Organization", style="green")
-    table.add_column("Location", style="yellow")
-    table.add_column("ASN", style="magenta")
-    
+    headers = ["IP Address", "Organization", "Location", "ASN"]
+    styles = ["cyan", "green", "yellow", "magenta"]
+    fields = ['ip', 'organization', 'city', 'country', 'asn']
     if verbose:
-        table.add_column("Network", style="blue")
-        table.add_column("Registration Date", style="bright_black")
-        table.add_column("Source", style="bright_black")
+        headers += ["Network", "Registration Date", "Source"]
+        styles += ["blue", "bright_black", "bright_black"]
+        fields += ['network', 'registered', 'source']
     
-    # Add rows
-    for result in results:
+    # Build every row up front, in one pass over the results
+    rows = []
+    for ip, organization, city, country, asn, *extra in _rows(results, fields):
         # Skip if no IP
-        if not result.get('ip'):
+        if not ip:
             continue
         
         # Prepare location string
-        location_parts = []
-        if result.get('city'):
-            location_parts.append(result['city'])
-        if result.get('country'):
-            location_parts.append(result['country'])
-        location = ", ".join(location_parts) if location_parts else "Unknown"
+        location = ", ".join(part for part in (city, country) if part) or "Unknown"
         
-        # Add row
-        if verbose:
-            table.add_row(
-                result.get('ip', 'Unknown'),
-                result.get('organization', 'Unknown'),
-                location,
-                result.get('asn', 'Unknown'),
-                result.get('network', 'Unknown'),
-                result.get('registered', 'Unknown'),
-                result.get('source', 'Unknown')
-            )
-        else:
-            table.add_row(
-                result.get('ip', 'Unknown'),
-                result.get('organization', 'Unknown'),
-                location,
-                result.get('asn', 'Unknown')
-            )
+        rows.append((
+            ip,
+            organization or 'Unknown',
+            location,
+            asn or 'Unknown',
+            *(value or 'Unknown' for value in extra)
+        ))
+    
+    if len(rows) > CONSOLE_PLAIN_TABLE_ROWS:
+        # Measure once, format every line, print the lot in one go
+        widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+        # No padding on the last column, so lines don't end in spaces
+        template = "  ".join([f"{{:<{width}}}" for width in widths[:-1]] + ["{}"])
+        lines = [template.format(*headers), template.format(*("-" * width for width in widths))]
+        lines.extend(template.format(*row) for row in rows)
+        console.print("IP WHOIS Lookup Results", style="italic")
+        console.out("\n".join(lines), highlight=False)
+        return
+    
+    # Create table
+    table = Table(title="IP WHOIS Lookup Results")
+    for header, style in zip(headers, styles):
+        table.add_column(header, style=style)
+    for row in rows:
+        table.add_row(*row)
     
     # Print table
     console.print(table)
@@ -102,16 +110,12 @@ def write_csv(results: List[WhoisResult], output_file: str) -> bool:
     try:
         logger.debug(f"Writing {len(results)} results to CSV file: {output_file}")
         
-        # Convert results to DataFrame
-        df = pd.DataFrame(results)
-        
-        # Ensure minimal columns
-        for col in ['ip', 'organization', 'country', 'city', 'asn', 'network', 'registered', 'source']:
-            if col not in df.columns:
-                df[col] = None
-        
-        # Write to CSV
-        df.to_csv(output_file, index=False)
+        # Streamed from the result dicts - missing fields come out empty,
+        # and anything else (like raw data) is left out
+        with open(output_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            writer.writerows(_rows(results, CSV_FIELDS))
         
         logger.debug(f"Successfully wrote CSV file: {output_file}")
         return True
@@ -136,22 +140,16 @@ def write_json(results: List[WhoisResult], output_file: str, include_raw: bool =
     try:
         logger.debug(f"Writing {len(results)} results to JSON file: {output_file}")
         
-        # Copy results to avoid modifying original
-        output_results = []
+        # Filtered views of each result - the originals are left alone
+        output_results = [
+            {k: v for k, v in result.items() if include_raw or k != 'raw'}
+            for result in results
+        ]
         
-        for result in results:
-            # Copy result
-            output_result = result.copy()
-            
-            # Remove raw data if not requested
-            if not include_raw and 'raw' in output_result:
-                del output_result['raw']
-            
-            output_results.append(output_result)
-        
-        # Write to JSON
-        with open(output_file, 'w') as f:
-            json.dump(output_results, f, indent=2)
+        # Write to JSON - orjson when it's there, and datetimes python-whois
+        # leaves in raw data come out as ISO 8601 strings either way
+        with open(output_file, 'wb') as f:
+            f.write(json_dumps(output_results, indent=True))
             
         logger.debug(f"Successfully wrote JSON file: {output_file}")
         return True
@@ -175,27 +173,29 @@ def write_text(results: List[WhoisResult], output_file: str) -> bool:
     try:
         logger.debug(f"Writing {len(results)} results to text file: {output_file}")
         
-        with open(output_file, 'w') as f:
-            f.write("IP WHOIS Lookup Results\n")
-            f.write("======================\n\n")
+        # Build everything as a list of strings and hand it over in one call
+        lines = ["IP WHOIS Lookup Results\n", "======================\n\n"]
+        append = lines.append
+        
+        for i, result in enumerate(results, 1):
+            append("Result %d:\n" % i)
+            append("  IP Address:       %s\n" % result.get('ip', 'Unknown'))
+            append("  Organization:     %s\n" % result.get('organization', 'Unknown'))
+            append("  Country:          %s\n" % result.get('country', 'Unknown'))
+            
+            if result.get('city'):
+                append("  City:             %s\n" % result['city'])
+            
+            append("  ASN:              %s\n" % result.get('asn', 'Unknown'))
+            append("  Network:          %s\n" % result.get('network', 'Unknown'))
             
-            for i, result in enumerate(results, 1):
-                f.write(f"Result {i}:\n")
-                f.write(f"  IP Address:       {result.get('ip', 'Unknown')}\n")
-                f.write(f"  Organization:     {result.get('organization', 'Unknown')}\n")
-                f.write(f"  Country:          {result.get('country', 'Unknown')}\n")
-                
-                if result.get('city'):
-                    f.write(f"  City:             {result['city']}\n")
-                
-                f.write(f"  ASN:              {result.get('asn', 'Unknown')}\n")
-                f.write(f"  Network:          {result.get('network', 'Unknown')}\n")
-                
-                if result.get('registered'):
-                    f.write(f"  Registration Date: {result['registered']}\n")
-                
-                f.write(f"  Source:           {result.get('source', 'Unknown')}\n")
-                f.write("\n")
+            if result.get('registered'):
+                append("  Registration Date: %s\n" % result['registered'])
+            
+            append("  Source:           %s\n\n" % result.get('source', 'Unknown'))
+        
+        with open(output_file, 'w') as f:
+            f.writelines(lines)
         
         logger.debug(f"Successfully wrote text file: {output_file}")
         return True
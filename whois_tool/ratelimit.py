@@ -0,0 +1,98 @@
+"""
+Rate limiting for WHOIS/RDAP servers.
+
+Each server gets its own token bucket, so a slow RIR doesn't hold up
+lookups that are headed somewhere else.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger('whois_tool.ratelimit')
+
+# Default requests per second allowed against any single server
+DEFAULT_SERVER_RATE = 10.0
+
+# We only need to remember recently used servers
+DEFAULT_MAX_SERVERS = 10_000
+
+
+class ServerRateLimiter:
+    """
+    Token bucket rate limiter keyed by server hostname.
+
+    Buckets refill at `rate` tokens per second up to `burst` tokens. Callers
+    take a token before talking to a server and only wait when the bucket for
+    *that* server is empty. Safe to share between threads and event loops.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_SERVER_RATE,
+        burst: Optional[float] = None,
+        max_servers: int = DEFAULT_MAX_SERVERS
+    ):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            rate: Tokens added per second for each server
+            burst: Maximum tokens a bucket can hold (default: one second's worth)
+            max_servers: Number of server buckets to keep before evicting the oldest
+        """
+        if rate <= 0:
+            raise ValueError("Server rate limit must be positive")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.max_servers = max_servers
+
+        # host -> (tokens, last_refill), least recently used first
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _reserve(self, host: str) -> float:
+        """
+        Take a token from a server's bucket.
+
+        The bucket is allowed to go negative, which reserves a future token
+        for the caller without holding the lock while they wait.
+
+        Args:
+            host: Server hostname
+
+        Returns:
+            Seconds to wait before the request may be sent
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, last_refill = self._buckets.pop(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last_refill) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+
+            # Forget servers we haven't talked to in a while
+            if len(self._buckets) > self.max_servers:
+                self._buckets.popitem(last=False)
+
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.rate
+
+    async def acquire(self, host: str) -> None:
+        """Wait (without blocking the event loop) until we may query host"""
+        delay = self._reserve(host)
+        if delay > 0:
+            logger.debug(f"Rate limiting {host}: sleeping for {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def wait(self, host: str) -> None:
+        """Blocking version of acquire for the sync resolvers"""
+        delay = self._reserve(host)
+        if delay > 0:
+            logger.debug(f"Rate limiting {host}: sleeping for {delay:.2f}s")
+            time.sleep(delay)
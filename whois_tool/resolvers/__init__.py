@@ -5,33 +5,79 @@ This package contains different resolver implementations for retrieving
 WHOIS information from various sources.
 """
 
+import importlib
+import importlib.util
 import logging
-from typing import Dict, List, Optional, Union, Type
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union, Type
 
 from .base import BaseResolver
-from .ipwhois_resolver import IPWhoisResolver
-from .python_whois_resolver import PythonWhoisResolver
-from .system_resolver import SystemWhoisResolver
 
 # Get logger
 logger = logging.getLogger('whois_tool.resolvers')
 
-# Map of resolver names to resolver classes
-RESOLVER_MAP: Dict[str, Type[BaseResolver]] = {
-    'IPWhoisResolver': IPWhoisResolver,
-    'PythonWhoisResolver': PythonWhoisResolver,
-    'SystemWhoisResolver': SystemWhoisResolver,
+# Map of resolver names to the modules that define them. Resolvers are only
+# imported when first used, so e.g. --lookup-method system never pays for
+# importing ipwhois or python-whois.
+RESOLVER_MODULES: Dict[str, str] = {
+    'CymruDNSResolver': '.cymru_dns_resolver',
+    'IPWhoisResolver': '.ipwhois_resolver',
+    'PythonWhoisResolver': '.python_whois_resolver',
+    'SystemWhoisResolver': '.system_resolver',
 }
 
+# Resolvers behind each lookup method, in the order they're tried. Auto
+# mode starts with Cymru's DNS answers since they're the cheapest; the
+# registries fill in whatever it doesn't have, and the engine stops going
+# down the list once the result is good enough.
+_METHOD_MAP: Dict[str, Tuple[str, ...]] = {
+    'auto': ('CymruDNSResolver', 'IPWhoisResolver', 'PythonWhoisResolver', 'SystemWhoisResolver'),
+    'cymru': ('CymruDNSResolver',),
+    'ipwhois': ('IPWhoisResolver',),
+    'pythonwhois': ('PythonWhoisResolver',),
+    'system': ('SystemWhoisResolver',),
+}
+
+
+def _load_resolver_class(name: str) -> Type[BaseResolver]:
+    """Import a resolver's module on first use and return its class"""
+    module = importlib.import_module(RESOLVER_MODULES[name], __name__)
+    return getattr(module, name)
+
+
+def __getattr__(name: str):
+    # Keep 'from whois_tool.resolvers import IPWhoisResolver' working
+    if name in RESOLVER_MODULES:
+        return _load_resolver_class(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=1)
+def _probe_resolvers() -> Tuple[str, ...]:
+    """Check which resolvers have their dependencies installed (done once)"""
+    available = []
+    if importlib.util.find_spec('dns') is not None:
+        available.append('CymruDNSResolver')
+    if importlib.util.find_spec('ipwhois') is not None:
+        available.append('IPWhoisResolver')
+    if importlib.util.find_spec('whois') is not None:
+        available.append('PythonWhoisResolver')
+    # Speaks port 43 itself, so nothing to install
+    available.append('SystemWhoisResolver')
+    return tuple(available)
+
 
 def get_available_resolvers() -> List[str]:
     """
     Get a list of available resolver names.
     
+    A resolver is available if the package or command it relies on is
+    installed. The check runs once per process; later calls are free.
+    
     Returns:
         List of resolver names
     """
-    return BaseResolver.get_all_resolvers()
+    return list(_probe_resolvers())
 
 
 def get_resolver(name: str, **kwargs) -> BaseResolver:
@@ -49,13 +95,13 @@ def get_resolver(name: str, **kwargs) -> BaseResolver:
         ValueError: If the resolver is not found or cannot be instantiated
     """
     # Check if the resolver exists in our map
-    if name not in RESOLVER_MAP:
+    if name not in RESOLVER_MODULES:
         available = ', '.join(get_available_resolvers())
         raise ValueError(f"Resolver '{name}' not found. Available resolvers: {available}")
     
     try:
         # Create an instance of the resolver
-        resolver_class = RESOLVER_MAP[name]
+        resolver_class = _load_resolver_class(name)
         return resolver_class(**kwargs)
     except Exception as e:
         # Handle instantiation errors
@@ -68,7 +114,7 @@ def get_resolver_by_method(method: str, **kwargs) -> Union[BaseResolver, List[Ba
     Get a resolver based on the lookup method.
     
     Args:
-        method: Lookup method (auto, ipwhois, pythonwhois, system)
+        method: Lookup method (auto, cymru, ipwhois, pythonwhois, system)
         **kwargs: Additional arguments for the resolver
         
     Returns:
@@ -77,24 +123,10 @@ def get_resolver_by_method(method: str, **kwargs) -> Union[BaseResolver, List[Ba
     Raises:
         ValueError: If the method is not valid
     """
-    if method == 'auto':
-        # Return all resolvers in preferred order
-        return [
-            IPWhoisResolver(**kwargs),
-            PythonWhoisResolver(**kwargs),
-            SystemWhoisResolver(**kwargs)
-        ]
-    elif method == 'ipwhois':
-        return IPWhoisResolver(**kwargs)
-    elif method == 'pythonwhois':
-        return PythonWhoisResolver(**kwargs)
-    elif method == 'system':
-        return SystemWhoisResolver(**kwargs)
-    else:
-        available = 'auto, ipwhois, pythonwhois, system'
+    names = _METHOD_MAP.get(method)
+    if names is None:
+        available = ', '.join(_METHOD_MAP)
         raise ValueError(f"Invalid lookup method '{method}'. Available methods: {available}")
-
-
-# Ensure all resolvers are registered
-for resolver_class in RESOLVER_MAP.values():
-    resolver_class.register()
+    
+    resolvers = [_load_resolver_class(name)(**kwargs) for name in names]
+    return resolvers if method == 'auto' else resolvers[0]
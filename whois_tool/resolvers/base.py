@@ -4,16 +4,90 @@ Base resolver class for IP WHOIS lookups.
 This module defines an abstract base class for WHOIS resolvers.
 """
 
+import os
 import time
+import random
+import socket
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List, ClassVar
+from typing import Dict, Any, Optional, List, ClassVar, Tuple, Union
 
+import requests
+
+from ..cache import TTLCache
 from ..util import validate_ip, normalize_whois_result, WhoisResult
+from ..ratelimit import ServerRateLimiter
 
 # Get logger
 logger = logging.getLogger('whois_tool.resolvers.base')
 
+# Longest we'll ever sleep between retries, in seconds
+MAX_RETRY_DELAY = 8.0
+
+# Every resolver remembers its own answers for this long (seconds), so
+# anything calling it directly doesn't hit the server twice for one IP.
+# WHOIS_CACHE_TTL overrides it; 0 turns the cache off.
+DEFAULT_RESULT_TTL = 86400.0
+
+# Lookups that failed for good (no data, reserved range...) are remembered
+# too, but not for long
+NEGATIVE_RESULT_TTL = 300.0
+
+# Most results kept at once, across all resolvers
+RESULT_CACHE_SIZE = 65536
+
+# Requests a resolver may send back to back before rate_limit spacing kicks
+# in. The long-run rate is still one per rate_limit seconds.
+DEFAULT_RATE_LIMIT_BURST = 3.0
+
+
+class TransientLookupError(ValueError):
+    """
+    A lookup failed in a way that may well work next time.
+    
+    Timeouts, dropped connections and server errors raise this; things that
+    will fail the same way every time (reserved IPs, unknown registries, no
+    data) raise a plain ValueError and are never retried.
+    """
+
+
+# Errors worth retrying - ours plus the raw network ones a library may let through
+TRANSIENT_ERRORS = (TransientLookupError, socket.timeout, TimeoutError, ConnectionError)
+
+
+def retry_delay(retry_count: int) -> float:
+    """
+    How long to wait before a retry: exponential, jittered and capped.
+    
+    The jitter keeps a batch of lookups that failed together from all
+    hitting the server again at the same instant.
+    
+    Args:
+        retry_count: Which retry this is (1 for the first)
+        
+    Returns:
+        Seconds to sleep
+    """
+    return min(MAX_RETRY_DELAY, random.uniform(0.5, 1.5) * (2 ** retry_count))
+
+
+def result_ttl_from_env() -> float:
+    """
+    Get the resolver result cache TTL, honouring WHOIS_CACHE_TTL.
+    
+    Returns:
+        TTL in seconds (0 means don't cache)
+    """
+    value = os.environ.get('WHOIS_CACHE_TTL')
+    if not value:
+        return DEFAULT_RESULT_TTL
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        logger.warning(f"Ignoring invalid WHOIS_CACHE_TTL {value!r}")
+        return DEFAULT_RESULT_TTL
+
 
 class BaseResolver(ABC):
     """
@@ -26,36 +100,157 @@ class BaseResolver(ABC):
     # Class variable for resolver registry
     resolver_registry: ClassVar[List[str]] = []
     
-    def __init__(self, rate_limit: float = 1.0):
+    # Token buckets used when no limiter is passed in, one per resolver type
+    # and rate - shared by every instance so concurrent lookups queue up
+    # behind each other instead of each thinking it's the first request
+    _fallback_limiters: ClassVar[Dict[Tuple[str, float, float], ServerRateLimiter]] = {}
+    _fallback_lock = threading.Lock()
+    
+    # How many requests the fallback bucket lets through at once
+    rate_limit_burst: ClassVar[float] = DEFAULT_RATE_LIMIT_BURST
+    
+    # (resolver name, *settings that change its answers, ip) -> normalized
+    # result, or the ValueError it failed with
+    _result_cache: ClassVar[TTLCache] = TTLCache(RESULT_CACHE_SIZE)
+    
+    # Resolvers that can answer many IPs in one go set this and implement
+    # _perform_lookup_batch
+    supports_batch: ClassVar[bool] = False
+    
+    def __init__(
+        self,
+        rate_limit: float = 1.0,
+        limiter: Optional[ServerRateLimiter] = None,
+        session: Optional[requests.Session] = None
+    ):
         """
         Initialize the resolver.
         
         Args:
-            rate_limit: Minimum time between requests in seconds (default: 1.0)
+            rate_limit: Average time between requests in seconds (default: 1.0)
+            limiter: Shared per-server rate limiter (replaces rate_limit when set)
+            session: Shared HTTP session for resolvers that talk HTTP
         """
         self.rate_limit = rate_limit
-        self.last_request_time = 0.0
+        self.limiter = limiter
+        self.session = session
+        self.result_ttl = result_ttl_from_env()
         self.name = self.__class__.__name__
         logger.debug(f"Initialized {self.name} with rate limit {rate_limit}s")
     
+    def _fallback_limiter(self) -> Optional[ServerRateLimiter]:
+        """
+        Get the token bucket shared by every resolver of this type and rate.
+        
+        Returns:
+            The shared limiter, or None if rate limiting is turned off
+        """
+        if self.rate_limit <= 0:
+            return None
+        
+        key = (self.name, self.rate_limit, self.rate_limit_burst)
+        limiter = self._fallback_limiters.get(key)
+        if limiter is None:
+            with self._fallback_lock:
+                limiter = self._fallback_limiters.get(key)
+                if limiter is None:
+                    # One token every rate_limit seconds, with a little
+                    # headroom so idle workers don't wait on a quiet server
+                    limiter = ServerRateLimiter(rate=1.0 / self.rate_limit, burst=max(1.0, self.rate_limit_burst))
+                    self._fallback_limiters[key] = limiter
+        return limiter
+    
+    def _rate_limiter(self) -> Optional[ServerRateLimiter]:
+        """
+        Get the limiter this resolver's requests go through.
+        
+        Returns:
+            The shared limiter if one was passed in, else the fallback
+            bucket (None if rate limiting is turned off)
+        """
+        return self.limiter if self.limiter is not None else self._fallback_limiter()
+    
+    def _rate_limit_key(self) -> Optional[str]:
+        """
+        Get the bucket _apply_rate_limit takes a token from before each lookup.
+        
+        Resolvers that know which servers they talk to take a token per
+        server themselves and return None here.
+        
+        Returns:
+            Bucket key (the resolver name by default), or None
+        """
+        return self.name
+    
     def _apply_rate_limit(self):
         """
         Apply rate limiting before making a request.
         
         This method ensures that requests are not made too frequently by
-        sleeping if necessary.
+        sleeping if necessary. The resolver name is used as the bucket key
+        since the underlying libraries pick the RIR server themselves.
+        Without a shared limiter, every resolver of the same type takes
+        turns on one bucket that allows a request every rate_limit seconds
+        on average, with bursts of up to rate_limit_burst.
         """
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
+        key = self._rate_limit_key()
+        limiter = self._rate_limiter()
+        if key is not None and limiter is not None:
+            limiter.wait(key)
+    
+    def configure_cache(self, enabled: bool) -> None:
+        """
+        Turn this resolver's own caches on or off, as its engine's cache is.
         
-        if elapsed < self.rate_limit:
-            # Sleep for the remaining time
-            sleep_time = self.rate_limit - elapsed
-            logger.debug(f"Rate limiting: sleeping for {sleep_time:.2f}s")
-            time.sleep(sleep_time)
-            
-        # Update the last request time
-        self.last_request_time = time.time()
+        Args:
+            enabled: False to stop remembering results (WHOIS_CACHE_TTL
+                still applies when True)
+        """
+        if not enabled:
+            self.result_ttl = 0
+    
+    def _cache_config(self) -> Tuple[Any, ...]:
+        """
+        Settings that change what this resolver answers, for the result cache key.
+        
+        Resolvers configured differently (e.g. ipwhois with and without RDAP)
+        mustn't hand each other their cached results.
+        
+        Returns:
+            Tuple of hashable settings (empty by default)
+        """
+        return ()
+    
+    def _cache_key(self, ip: str) -> Tuple[Any, ...]:
+        """Result cache key for ip from this resolver, as configured"""
+        return (self.name, *self._cache_config(), ip)
+    
+    def _get_cached_result(self, ip: str) -> Optional[Union[WhoisResult, ValueError]]:
+        """Previous answer for ip from this resolver, or None"""
+        if self.result_ttl <= 0:
+            return None
+        return self._result_cache.get(self._cache_key(ip))
+    
+    def _cache_result(self, ip: str, result: Union[WhoisResult, ValueError]) -> None:
+        """Remember a result, or a failure that won't go away by retrying"""
+        if self.result_ttl <= 0:
+            return
+        ttl = min(NEGATIVE_RESULT_TTL, self.result_ttl) if isinstance(result, ValueError) else self.result_ttl
+        self._result_cache.set(self._cache_key(ip), result, ttl)
+    
+    def invalidate(self, ip: str) -> None:
+        """
+        Forget this resolver's cached answer for an IP.
+        
+        Args:
+            ip: IP address to forget
+        """
+        self._result_cache.pop(self._cache_key(ip))
+    
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Forget every cached answer, for all resolvers"""
+        cls._result_cache.clear()
     
     @abstractmethod
     def _perform_lookup(self, ip: str, timeout: Optional[float] = None) -> Dict[str, Any]:
@@ -87,12 +282,19 @@ class BaseResolver(ABC):
             Normalized WHOIS information
             
         Raises:
-            ValueError: If the IP address is invalid
-            Exception: If the lookup fails after retries
+            ValueError: If the IP address is invalid, the lookup fails for
+                good, or it still fails after retries
         """
         # Validate the IP address
         validate_ip(ip)
         
+        cached = self._get_cached_result(ip)
+        if cached is not None:
+            logger.debug(f"Using cached {self.name} result for {ip}")
+            if isinstance(cached, ValueError):
+                raise ValueError(str(cached))
+            return dict(cached)
+        
         # Initialize retry counter
         retry_count = 0
         last_error = None
@@ -111,28 +313,130 @@ class BaseResolver(ABC):
                 # Perform the lookup
                 raw_result = self._perform_lookup(ip, timeout)
                 
-                # Make sure the IP is included in the result
-                if 'ip' not in raw_result:
-                    raw_result['ip'] = ip
-                    
                 # Normalize the result
-                result = normalize_whois_result(raw_result, self.name)
+                result = self._normalize(raw_result, ip)
+                self._cache_result(ip, result)
                 
                 logger.debug(f"Lookup successful for {ip} using {self.name}")
-                return result
+                return dict(result)
                 
             except Exception as e:
                 last_error = e
                 retry_count += 1
                 
+                # No point retrying something that will fail the same way again
+                if not isinstance(e, TRANSIENT_ERRORS):
+                    logger.error(f"Lookup failed for {ip} using {self.name}: {e}")
+                    error = ValueError(f"Lookup failed: {e}")
+                    self._cache_result(ip, error)
+                    raise error
+                
                 if retry_count <= max_retries:
                     logger.warning(f"Lookup failed for {ip} using {self.name}: {e}. Retrying ({retry_count}/{max_retries})...")
-                    # Exponential backoff for retries
-                    time.sleep(retry_count * 2)
+                    time.sleep(retry_delay(retry_count))
                 else:
                     logger.error(f"Lookup failed for {ip} using {self.name} after {max_retries} retries: {e}")
                     raise ValueError(f"Lookup failed: {e}")
     
+    def _perform_lookup_batch(
+        self,
+        ips: List[str],
+        timeout: Optional[float] = None
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Perform the actual WHOIS lookup for several IPs at once.
+        
+        Only called when supports_batch is set.
+        
+        Args:
+            ips: IP addresses to look up
+            timeout: Timeout in seconds per IP (None for default)
+            
+        Returns:
+            Raw WHOIS data for each IP, in order - or the exception its
+            lookup failed with
+        """
+        raise NotImplementedError(f"{self.name} can't do batch lookups")
+    
+    def _normalize(self, raw_result: Dict[str, Any], ip: str) -> WhoisResult:
+        """Normalize raw resolver output, making sure the IP is in it"""
+        if 'ip' not in raw_result:
+            raw_result['ip'] = ip
+        return normalize_whois_result(raw_result, self.name)
+    
+    def lookup_batch(
+        self,
+        ips: List[str],
+        timeout: Optional[float] = None,
+        max_retries: int = 2
+    ) -> List[Union[WhoisResult, ValueError]]:
+        """
+        Look up WHOIS information for several IP addresses.
+        
+        Resolvers with supports_batch set answer the whole list with one
+        rate limit token and one _perform_lookup_batch call; IPs that fail
+        transiently there get retried one at a time through lookup().
+        Everything else just loops over lookup().
+        
+        Args:
+            ips: IP addresses to look up
+            timeout: Timeout in seconds per IP (None for default)
+            max_retries: Maximum number of retry attempts per IP
+            
+        Returns:
+            Normalized WHOIS information for each IP, in order - or the
+            ValueError its lookup failed with
+        """
+        results: List[Union[WhoisResult, ValueError]] = []
+        
+        if not self.supports_batch:
+            for ip in ips:
+                try:
+                    results.append(self.lookup(ip, timeout, max_retries))
+                except ValueError as e:
+                    results.append(e)
+            return results
+        
+        # Weed out bad IPs, and ones we already know about, before they
+        # cost a query
+        valid = []
+        for ip in ips:
+            try:
+                validate_ip(ip)
+            except ValueError:
+                continue
+            if self._get_cached_result(ip) is None:
+                valid.append(ip)
+        
+        raw_results: Dict[str, Union[Dict[str, Any], Exception]] = {}
+        if valid:
+            self._apply_rate_limit()
+            logger.debug(f"Looking up {len(valid)} IPs using {self.name} batch lookup")
+            raw_results = dict(zip(valid, self._perform_lookup_batch(valid, timeout)))
+        
+        for ip in ips:
+            raw_result = raw_results.get(ip)
+            
+            if isinstance(raw_result, dict):
+                result = self._normalize(raw_result, ip)
+                self._cache_result(ip, result)
+                results.append(dict(result))
+            elif raw_result is None or (max_retries > 0 and isinstance(raw_result, TRANSIENT_ERRORS)):
+                # Invalid and cached IPs get their usual answer from
+                # lookup(), and transient failures get the usual retries
+                try:
+                    results.append(self.lookup(ip, timeout, max_retries))
+                except ValueError as e:
+                    results.append(e)
+            else:
+                logger.error(f"Lookup failed for {ip} using {self.name}: {raw_result}")
+                error = ValueError(f"Lookup failed: {raw_result}")
+                if not isinstance(raw_result, TRANSIENT_ERRORS):
+                    self._cache_result(ip, error)
+                results.append(error)
+        
+        return results
+    
     @classmethod
     def register(cls) -> None:
         """
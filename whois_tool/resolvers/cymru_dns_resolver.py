@@ -0,0 +1,354 @@
+"""
+Team Cymru DNS resolver implementation.
+
+This module provides a resolver that gets ASN, network, country and
+organization info from Team Cymru's IP-to-ASN DNS service. One UDP round
+trip per query instead of RDAP's HTTP + TLS, and it's the interface Cymru
+asks bulk users to prefer. Big batches go to Cymru's bulk WHOIS service
+instead, which answers a whole list of IPs over one connection.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Union
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+import requests
+
+from ..util import parse_ip, canonical_ip
+from ..ratelimit import ServerRateLimiter
+from .base import BaseResolver, TransientLookupError
+from .system_resolver import query_whois_server
+
+# Get logger
+logger = logging.getLogger('whois_tool.resolvers.cymru')
+
+# Origin lookups live in a per-family zone, AS names in one shared zone
+CYMRU_ORIGIN_ZONES = {4: 'origin.asn.cymru.com', 6: 'origin6.asn.cymru.com'}
+CYMRU_ASN_ZONE = 'asn.cymru.com'
+
+# Bulk WHOIS takes "begin / verbose / one IP per line / end" on port 43
+CYMRU_BULK_WHOIS_SERVER = 'whois.cymru.com'
+
+# Batches at least this big go to bulk WHOIS - one TCP connection instead
+# of two DNS queries per IP
+BULK_WHOIS_MIN_BATCH = 64
+
+# Same default the other resolvers use
+DEFAULT_TIMEOUT = 30.0
+
+
+def cymru_origin_name(ip: str) -> str:
+    """
+    Build the origin TXT query name for an IP.
+
+    Args:
+        ip: IP address to look up
+
+    Returns:
+        e.g. '8.8.8.8.origin.asn.cymru.com' for 8.8.8.8
+    """
+    addr = parse_ip(ip)
+    # reverse_pointer is e.g. '8.8.8.8.in-addr.arpa' - swap the suffix for Cymru's zone
+    return f"{addr.reverse_pointer.rsplit('.', 2)[0]}.{CYMRU_ORIGIN_ZONES[addr.version]}"
+
+
+def parse_cymru_origin(txt: str, ip: str) -> Dict[str, Any]:
+    """
+    Parse a Team Cymru origin TXT record.
+
+    Records look like '15169 | 8.8.8.0/24 | US | arin | 2023-12-28'.
+
+    Args:
+        txt: TXT record contents
+        ip: IP address that was looked up
+
+    Returns:
+        Raw WHOIS data as a dictionary
+    """
+    fields = [field.strip() for field in txt.strip('"').split('|')]
+    result: Dict[str, Any] = {'ip': ip}
+
+    # Prefixes announced by several ASes list them all - take the first
+    if fields[0]:
+        result['asn'] = fields[0].split()[0]
+    if len(fields) > 1 and fields[1]:
+        result['network'] = {'cidr': fields[1]}
+    if len(fields) > 2 and fields[2]:
+        result['country'] = fields[2]
+    if len(fields) > 4 and fields[4]:
+        result['registered'] = fields[4]
+
+    return result
+
+
+def parse_cymru_as_name(txt: str) -> Optional[str]:
+    """
+    Pull the AS name out of a Team Cymru AS TXT record.
+
+    Records look like '15169 | US | arin | 2000-03-30 | GOOGLE, US'.
+
+    Args:
+        txt: TXT record contents
+
+    Returns:
+        The AS name, or None if the record doesn't have one
+    """
+    fields = [field.strip() for field in txt.strip('"').split('|')]
+    if len(fields) > 4 and fields[4]:
+        return fields[4]
+    return None
+
+
+def parse_cymru_bulk_response(output: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse Team Cymru's verbose bulk WHOIS output.
+
+    Rows look like
+    '15169 | 8.8.8.8 | 8.8.8.0/24 | US | arin | 2023-12-28 | GOOGLE, US'
+    (AS, IP, BGP prefix, country, registry, allocated, AS name).
+
+    Args:
+        output: Raw bulk WHOIS response
+
+    Returns:
+        Raw WHOIS data keyed by canonical IP, for the IPs Cymru had an
+        origin AS for
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+
+    for line in output.splitlines():
+        fields = [field.strip() for field in line.split('|', 6)]
+        # Skips the banner, the column headers, errors and unrouted IPs ('NA')
+        if len(fields) < 7 or not fields[0].isdigit():
+            continue
+
+        ip = canonical_ip(fields[1])
+        if ip is None:
+            continue
+
+        result: Dict[str, Any] = {'ip': ip, 'asn': fields[0]}
+        if fields[2] and fields[2] != 'NA':
+            result['network'] = {'cidr': fields[2]}
+        if fields[3]:
+            result['country'] = fields[3]
+        if fields[5]:
+            result['registered'] = fields[5]
+        if fields[6] and fields[6] != 'NA':
+            result['org'] = fields[6]
+        results[ip] = result
+
+    return results
+
+
+def wrap_dns_error(error: Exception) -> ValueError:
+    """
+    Turn a DNS failure into the error type the resolvers raise.
+
+    Timeouts and unreachable nameservers are worth retrying; NXDOMAIN and
+    friends mean Cymru has nothing for this IP and never will.
+
+    Args:
+        error: Exception raised by dnspython
+
+    Returns:
+        A TransientLookupError or a plain ValueError
+    """
+    if isinstance(error, (dns.exception.Timeout, dns.resolver.NoNameservers)):
+        return TransientLookupError(f"Cymru DNS error: {error}")
+    return ValueError(f"Cymru DNS error: {error}")
+
+
+def _txt(answer) -> str:
+    """Join the strings of the first TXT record in an answer"""
+    return b''.join(answer[0].strings).decode('utf-8', errors='replace')
+
+
+def _loop_is_running() -> bool:
+    """Whether this thread is already inside a running event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+async def lookup_cymru_async(ip: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Origin + AS name lookup for one IP, without blocking the event loop.
+
+    Args:
+        ip: IP address to look up
+        timeout: Timeout in seconds per query (None for default)
+
+    Returns:
+        Raw WHOIS data as a dictionary
+
+    Raises:
+        dns.exception.DNSException: If a query fails
+    """
+    lifetime = timeout or DEFAULT_TIMEOUT
+    answer = await dns.asyncresolver.resolve(cymru_origin_name(ip), 'TXT', lifetime=lifetime)
+    result = parse_cymru_origin(_txt(answer), ip)
+
+    # The AS name is the closest thing Cymru has to an organization
+    if 'asn' in result:
+        answer = await dns.asyncresolver.resolve(f"AS{result['asn']}.{CYMRU_ASN_ZONE}", 'TXT', lifetime=lifetime)
+        org = parse_cymru_as_name(_txt(answer))
+        if org:
+            result['org'] = org
+
+    return result
+
+
+class CymruDNSResolver(BaseResolver):
+    """
+    WHOIS resolver implementation using Team Cymru's DNS interface.
+
+    Answers are lighter than a registry lookup (no contacts, BGP prefix
+    rather than the allocated block), but they're fast and cheap, so this
+    goes first in auto mode and the registries fill in the rest.
+    """
+
+    # Batches go out as concurrent DNS queries on one event loop
+    supports_batch = True
+
+    def __init__(
+        self,
+        rate_limit: float = 0.1,
+        limiter: Optional[ServerRateLimiter] = None,
+        session: Optional[requests.Session] = None
+    ):
+        """
+        Initialize the Cymru DNS resolver.
+
+        Args:
+            rate_limit: Average time between requests in seconds (default: 0.1)
+            limiter: Shared per-server rate limiter (replaces rate_limit when set)
+            session: Shared HTTP session (unused - this resolver only speaks DNS)
+        """
+        super().__init__(rate_limit, limiter, session)
+        self.name = "CymruDNSResolver"
+        logger.debug(f"Initialized {self.name}")
+
+    def _perform_lookup(self, ip: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Perform the lookup with two TXT queries: origin, then AS name.
+
+        Args:
+            ip: IP address to look up
+            timeout: Timeout in seconds (None for default)
+
+        Returns:
+            Raw WHOIS data as a dictionary
+
+        Raises:
+            ValueError: If lookup fails
+        """
+        lifetime = timeout or DEFAULT_TIMEOUT
+
+        try:
+            logger.debug(f"Performing Cymru DNS lookup for {ip}")
+            answer = dns.resolver.resolve(cymru_origin_name(ip), 'TXT', lifetime=lifetime)
+            result = parse_cymru_origin(_txt(answer), ip)
+
+            if 'asn' in result:
+                answer = dns.resolver.resolve(f"AS{result['asn']}.{CYMRU_ASN_ZONE}", 'TXT', lifetime=lifetime)
+                org = parse_cymru_as_name(_txt(answer))
+                if org:
+                    result['org'] = org
+
+            return result
+
+        except dns.exception.DNSException as e:
+            logger.error(f"Cymru DNS error for {ip}: {e}")
+            raise wrap_dns_error(e)
+
+    def _perform_lookup_batch(
+        self,
+        ips: List[str],
+        timeout: Optional[float] = None
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Look up many IPs at once, with every query in flight concurrently.
+
+        Batches of BULK_WHOIS_MIN_BATCH or more go to Cymru's bulk WHOIS
+        service in one query instead.
+
+        Args:
+            ips: IP addresses to look up
+            timeout: Timeout in seconds per IP (None for default)
+
+        Returns:
+            Raw WHOIS data for each IP, in order - or the exception its
+            lookup failed with (see wrap_dns_error)
+        """
+        if len(ips) >= BULK_WHOIS_MIN_BATCH:
+            return self._perform_lookup_bulk(ips, timeout)
+
+        if _loop_is_running():
+            # asyncio.run() can't start a loop from inside one (Jupyter, an
+            # async host app...), so ask one at a time instead
+            logger.debug(f"Event loop already running - looking up {len(ips)} IPs one by one")
+            return [self._lookup_one(ip, timeout) for ip in ips]
+
+        async def run():
+            return await asyncio.gather(
+                *(lookup_cymru_async(ip, timeout) for ip in ips),
+                return_exceptions=True
+            )
+
+        logger.debug(f"Performing Cymru DNS batch lookup for {len(ips)} IPs")
+        results = asyncio.run(run())
+
+        return [wrap_dns_error(r) if isinstance(r, Exception) else r for r in results]
+
+    def _lookup_one(self, ip: str, timeout: Optional[float] = None) -> Union[Dict[str, Any], Exception]:
+        """_perform_lookup for one IP of a batch, returning the error instead of raising it"""
+        try:
+            return self._perform_lookup(ip, timeout)
+        except Exception as e:
+            return e
+
+    def _perform_lookup_bulk(
+        self,
+        ips: List[str],
+        timeout: Optional[float] = None
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Look up many IPs with a single bulk WHOIS query.
+
+        Args:
+            ips: IP addresses to look up
+            timeout: Timeout in seconds for each read (None for default)
+
+        Returns:
+            Raw WHOIS data for each IP, in order - or the exception its
+            lookup failed with
+        """
+        query = '\n'.join(['begin', 'verbose', *ips, 'end'])
+
+        try:
+            logger.debug(f"Performing Cymru bulk WHOIS lookup for {len(ips)} IPs")
+            output = query_whois_server(CYMRU_BULK_WHOIS_SERVER, query, timeout)
+        except TransientLookupError as e:
+            # lookup_batch retries these one at a time over DNS
+            logger.warning(f"Cymru bulk WHOIS failed for {len(ips)} IPs: {e}")
+            return [e] * len(ips)
+
+        found = parse_cymru_bulk_response(output)
+
+        results: List[Union[Dict[str, Any], Exception]] = []
+        for ip in ips:
+            result = found.get(canonical_ip(ip))
+            if result is None:
+                results.append(ValueError(f"No Cymru origin AS for {ip}"))
+            else:
+                results.append(dict(result, ip=ip))
+        return results
+
+
+# Register the resolver
+CymruDNSResolver.register()
@@ -4,9 +4,8 @@ RDAP/WHOIS resolver using the ipwhois package.
 This is our primary resolver since it gives the most reliable results.
 """
 
-import socket
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
 from ipwhois import IPWhois
 from ipwhois.exceptions import (
@@ -14,32 +13,61 @@ from ipwhois.exceptions import (
 )
 
 from ..util import WhoisResult
-from .base import BaseResolver
+from ..http_session import build_opener, get_shared_session
+from .base import BaseResolver, TransientLookupError
 
 # Set up logging
 logger = logging.getLogger('whois_tool.resolvers.ipwhois')
 
+# ipwhois' own default
+DEFAULT_TIMEOUT = 5
+
+# Where ipwhois asks for the ASN before an RDAP lookup (port 43, so it
+# doesn't go through our opener)
+CYMRU_ASN_WHOIS_SERVER = 'whois.cymru.com'
+
 
 class IPWhoisResolver(BaseResolver):
     """Uses ipwhois package to get RDAP/WHOIS data"""
     
-    def __init__(self, rate_limit=1.0, use_rdap=True):
-        super().__init__(rate_limit)
+    def __init__(self, rate_limit=1.0, use_rdap=True, limiter=None, session=None):
+        super().__init__(rate_limit, limiter, session)
         self.use_rdap = use_rdap
         self.name = "IPWhoisResolver"
+        
+        # ipwhois wants a urllib opener - wrap the shared session so RDAP
+        # requests reuse pooled connections instead of handshaking every time.
+        # Without an engine-provided session, share the process-wide one.
+        # RDAP requests wait on the bucket of the host they go to.
+        if self.session is None:
+            self.session = get_shared_session()
+        self.opener = build_opener(self.session, self._rate_limiter() if use_rdap else None)
+
+    def _cache_config(self) -> Tuple[Any, ...]:
+        """RDAP and legacy WHOIS answers differ, so they're cached apart"""
+        return (self.use_rdap,)
+
+    def _rate_limit_key(self) -> Optional[str]:
+        """RDAP is limited per host by the opener - legacy WHOIS can't tell which server ipwhois picks"""
+        return None if self.use_rdap else self.name
 
     def _perform_lookup(self, ip: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Do the actual lookup via ipwhois"""
         try:
-            # Initialize the IPWhois object
-            obj = IPWhois(ip)
-            
-            # Set the timeout if provided
-            if timeout is not None:
-                socket.setdefaulttimeout(timeout)
+            # Initialize the IPWhois object. The timeout goes to its own
+            # sockets and HTTP requests - never the process-wide default,
+            # which other worker threads would trample on.
+            obj = IPWhois(
+                ip,
+                timeout=timeout if timeout is not None else DEFAULT_TIMEOUT,
+                proxy_opener=self.opener
+            )
             
             # Perform the lookup
             if self.use_rdap:
+                limiter = self._rate_limiter()
+                if limiter is not None:
+                    limiter.wait(CYMRU_ASN_WHOIS_SERVER)
                 logger.debug(f"Performing RDAP lookup for {ip}")
                 result = obj.lookup_rdap(
                     asn_methods=['whois', 'http'],
@@ -64,10 +92,10 @@ class IPWhoisResolver(BaseResolver):
             raise ValueError(f"ASN registry error: {e}")
         except HTTPLookupError as e:
             logger.error(f"HTTP lookup error for {ip}: {e}")
-            raise ValueError(f"HTTP lookup error: {e}")
+            raise TransientLookupError(f"HTTP lookup error: {e}")
         except WhoisLookupError as e:
             logger.error(f"WHOIS lookup error for {ip}: {e}")
-            raise ValueError(f"WHOIS lookup error: {e}")
+            raise TransientLookupError(f"WHOIS lookup error: {e}")
         except Exception as e:
             logger.error(f"Unexpected error during lookup for {ip}: {e}")
             raise ValueError(f"Unexpected error during lookup: {e}")
@@ -4,19 +4,40 @@ Python-WHOIS resolver implementation.
 This module provides a resolver implementation using the python-whois package.
 """
 
+import inspect
 import logging
 import socket
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, ClassVar
 
+import requests
 import whois
 from whois.parser import PywhoisError
 
-from ..util import WhoisResult
-from .base import BaseResolver
+from ..cache import TTLCache, PersistentTTLCache
+from ..util import WhoisResult, is_public_ip
+from ..ratelimit import ServerRateLimiter
+from .base import BaseResolver, TransientLookupError
 
 # Get logger
 logger = logging.getLogger('whois_tool.resolvers.pythonwhois')
 
+# How long reverse DNS answers (including "no PTR record") are remembered
+DEFAULT_PTR_TTL = 900.0
+
+# Most PTR answers kept in memory at once
+PTR_CACHE_SIZE = 65536
+
+# Tells "not cached" apart from a cached "no PTR record" (None)
+_NOT_CACHED = object()
+
+# python-whois takes a per-query timeout from 0.9.6 on. Older versions set
+# their own 10 second socket timeout, which we can't change.
+_WHOIS_TAKES_TIMEOUT = 'timeout' in inspect.signature(whois.whois).parameters
+
+# Fields kept from a python-whois entry. The rest (the full response text,
+# name servers, status lists...) would only be carried around in 'raw'.
+_WANTED = ('domain_name', 'registrar', 'org', 'name', 'country', 'city', 'emails', 'creation_date')
+
 
 class PythonWhoisResolver(BaseResolver):
     """
@@ -27,34 +48,76 @@ class PythonWhoisResolver(BaseResolver):
     This is primarily used as a fallback.
     """
     
-    def __init__(self, rate_limit: float = 1.5):
+    # ip -> hostname or None, shared by every instance - in memory only, or
+    # also on disk between runs for resolvers whose engine has its cache on
+    _memory_ptr_cache: ClassVar[TTLCache] = TTLCache(PTR_CACHE_SIZE)
+    _persistent_ptr_cache: ClassVar[TTLCache] = PersistentTTLCache('ptr', PTR_CACHE_SIZE)
+    
+    def __init__(
+        self,
+        rate_limit: float = 1.5,
+        limiter: Optional[ServerRateLimiter] = None,
+        session: Optional[requests.Session] = None,
+        ptr_ttl: float = DEFAULT_PTR_TTL
+    ):
         """
         Initialize the Python-WHOIS resolver.
         
         Args:
-            rate_limit: Minimum time between requests in seconds (default: 1.5)
+            rate_limit: Average time between requests in seconds (default: 1.5)
+            limiter: Shared per-server rate limiter (replaces rate_limit when set)
+            session: Shared HTTP session (unused - python-whois only speaks port 43)
+            ptr_ttl: How long to remember reverse DNS answers in seconds (default: 900)
         """
-        super().__init__(rate_limit)
+        super().__init__(rate_limit, limiter, session)
         self.name = "PythonWhoisResolver"
-        logger.debug(f"Initialized {self.name}")
+        self.ptr_ttl = ptr_ttl
+        self._ptr_cache = self._memory_ptr_cache
+        logger.debug("Initialized %s", self.name)
+    
+    def configure_cache(self, enabled: bool) -> None:
+        """
+        Turn this resolver's own caches on or off, as its engine's cache is.
+        
+        With the cache on, reverse DNS answers are also kept on disk.
+        
+        Args:
+            enabled: Whether the engine's cache is on
+        """
+        super().configure_cache(enabled)
+        self._ptr_cache = self._persistent_ptr_cache if enabled else self._memory_ptr_cache
     
     def _ip_to_domain(self, ip: str) -> Optional[str]:
         """
         Attempt to convert an IP to a domain name using reverse DNS lookup.
         
+        Answers are cached for ptr_ttl seconds, failures included, so a
+        repeated IP doesn't block on DNS again - in this run or the next.
+        
         Args:
             ip: IP address to convert
             
         Returns:
             Domain name or None if conversion fails
         """
+        # Private, loopback, multicast... nobody out there has PTR records
+        # for those, and asking can mean waiting for a DNS timeout
+        if not is_public_ip(ip):
+            return None
+        
+        domain_name = self._ptr_cache.get(ip, _NOT_CACHED)
+        if domain_name is not _NOT_CACHED:
+            return domain_name
+        
         try:
             domain_name = socket.gethostbyaddr(ip)[0]
-            logger.debug(f"Resolved IP {ip} to domain {domain_name}")
-            return domain_name
+            logger.debug("Resolved IP %s to domain %s", ip, domain_name)
         except (socket.herror, socket.gaierror) as e:
-            logger.debug(f"Failed to resolve IP {ip} to domain: {e}")
-            return None
+            logger.debug("Failed to resolve IP %s to domain: %s", ip, e)
+            domain_name = None
+        
+        self._ptr_cache.set(ip, domain_name, self.ptr_ttl)
+        return domain_name
     
     def _perform_lookup(self, ip: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
@@ -73,46 +136,54 @@ class PythonWhoisResolver(BaseResolver):
         Raises:
             ValueError: If lookup fails
         """
+        if not is_public_ip(ip):
+            raise ValueError(f"No public WHOIS data for non-public address {ip}")
+        
         try:
             # Try to convert IP to domain
             domain = self._ip_to_domain(ip)
             
             if not domain:
-                logger.warning(f"Could not resolve IP {ip} to domain")
+                logger.warning("Could not resolve IP %s to domain", ip)
                 raise ValueError(f"Could not resolve IP {ip} to domain")
             
-            # Set timeout if provided
-            if timeout is not None:
-                socket.setdefaulttimeout(timeout)
+            # Pass the timeout along rather than changing the process-wide
+            # socket default under every other thread's feet
+            kwargs = {}
+            if timeout is not None and _WHOIS_TAKES_TIMEOUT:
+                kwargs['timeout'] = timeout
             
             # Perform the lookup
-            logger.debug(f"Performing WHOIS lookup for domain {domain}")
-            result = whois.whois(domain)
+            logger.debug("Performing WHOIS lookup for domain %s", domain)
+            result = whois.whois(domain, **kwargs)
             
             if not result or not result.domain_name:
-                logger.warning(f"No WHOIS data found for domain {domain}")
+                logger.warning("No WHOIS data found for domain %s", domain)
                 raise ValueError(f"No WHOIS data found for domain {domain}")
             
-            # Convert result to dictionary if it isn't already
-            if not isinstance(result, dict):
-                result_dict = result.__dict__
+            # Just the fields worth keeping, in a plain dict
+            if isinstance(result, dict):
+                result_dict = {key: result.get(key) for key in _WANTED}
             else:
-                result_dict = result
-                
+                result_dict = {key: getattr(result, key, None) for key in _WANTED}
+            
             # Add IP to result
             result_dict['ip'] = ip
             
-            logger.debug(f"Lookup successful for domain {domain}")
+            logger.debug("Lookup successful for domain %s", domain)
             return result_dict
             
         except PywhoisError as e:
-            logger.error(f"Python WHOIS error for {ip}: {e}")
+            logger.error("Python WHOIS error for %s: %s", ip, e)
             raise ValueError(f"Python WHOIS error: {e}")
         except ValueError:
             # Re-raise ValueError
             raise
+        except (socket.timeout, ConnectionError) as e:
+            logger.error("Network error during lookup for %s: %s", ip, e)
+            raise TransientLookupError(f"Network error during lookup: {e}")
         except Exception as e:
-            logger.error(f"Unexpected error during lookup for {ip}: {e}")
+            logger.error("Unexpected error during lookup for %s: %s", ip, e)
             raise ValueError(f"Unexpected error during lookup: {e}")
 
 
@@ -1,42 +1,336 @@
 """
 System WHOIS resolver implementation.
 
-This module provides a resolver implementation using the system whois command.
+This module provides a resolver that speaks the WHOIS protocol (port 43)
+directly, following IANA's referral to the right RIR. It can also run the
+system whois command instead, when pointed at one.
 """
 
+import ipaddress
 import logging
 import re
+import socket
 import subprocess
 import json
 from typing import Dict, Any, Optional, List, Tuple
 
+import requests
+
 from ..util import WhoisResult
-from .base import BaseResolver
+from ..ratelimit import ServerRateLimiter
+from .base import BaseResolver, TransientLookupError
+from .whois_pool import WhoisServerPool, default_pool, is_pushback_error, is_rate_limit_response
 
 # Get logger
 logger = logging.getLogger('whois_tool.resolvers.system')
 
+# IANA tells us which RIR WHOIS server is authoritative for an IP
+IANA_WHOIS_SERVER = 'whois.iana.org'
+WHOIS_PORT = 43
+
+# Used when IANA's answer doesn't name a server
+DEFAULT_WHOIS_SERVER = 'whois.arin.net'
+
+# Some servers need a special query syntax to return the full record
+WHOIS_QUERY_FORMATS = {
+    'whois.arin.net': 'n + {ip}',
+}
+
+# Same default the other resolvers use
+DEFAULT_TIMEOUT = 30.0
+
+# Bytes asked for per recv() - most responses arrive in one or two reads
+WHOIS_RECV_SIZE = 64 * 1024
+
+_REFER_RE = re.compile(r'^(?:refer|whois):\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+# ARIN points at another registry for space it handed over (e.g. legacy
+# blocks now held by RIPE). rwhois:// referrals aren't followed.
+_ARIN_REFERRAL_RE = re.compile(r'^ReferralServer:\s*whois://([^\s:/]+)', re.IGNORECASE | re.MULTILINE)
+
+# IANA hands out space in big blocks, so one referral covers a whole /8 (or
+# IPv6 /32). Remembering them keeps us from asking IANA about every single IP.
+# Shared with the async engine through cached_whois_server and
+# remember_whois_server. Two threads racing on the same block just both ask
+# IANA, so no lock.
+_referral_cache: Dict[str, str] = {}
+
+
+# Regular expressions for key information - alternatives for each field are
+# folded into one compiled pattern, tried in order. They're anchored to the
+# start of a line, so each one scans the whole output in one go and comment
+# lines (starting with % or #) can never match. Nothing after the colon may
+# cross a newline, or an empty field would swallow the next line - and the
+# value has to start with something other than whitespace, so an empty
+# field on a CRLF line doesn't capture a lone '\r'.
+_FIELD_PATTERNS = [
+    (key, re.compile(
+        '^[ \t]*(?:' + '|'.join(f'(?:{pattern})' for pattern in patterns) + ')',
+        re.IGNORECASE | re.MULTILINE
+    ))
+    for key, patterns in {
+        'organization': [
+            r'(?:Organization|Org(?:anization)? Name):[ \t]*(\S[^\n]*)$',
+            r'(?:descr|owner):[ \t]*(\S[^\n]*)$'
+        ],
+        'country': [
+            r'(?:Country|Country Code):[ \t]*(\S[^\n]*)$',
+            r'country:[ \t]*(\S[^\n]*)$'
+        ],
+        'asn': [
+            r'(?:OriginAS|Origin AS|ASNumber|ASN):[ \t]*(\S[^\n]*)$',
+            r'origin:[ \t]*AS(\d+)[ \t\r]*$'
+        ],
+        'network': [
+            r'(?:CIDR|NetRange|Network):[ \t]*(\S[^\n]*)$',
+            r'inetnum:[ \t]*(\S[^\n]*)$'
+        ],
+        'registered': [
+            r'(?:RegDate|Created|Registration Date):[ \t]*(\S[^\n]*)$',
+            r'created:[ \t]*(\S[^\n]*)$'
+        ]
+    }.items()
+]
+
+
+def parse_whois_output(output: str, ip: str) -> Dict[str, Any]:
+    """
+    Parse raw WHOIS output into a structured dictionary.
+    
+    This is shared by the system resolver and the async port 43 client.
+    
+    Args:
+        output: Raw WHOIS output
+        ip: IP address
+        
+    Returns:
+        Parsed WHOIS data as a dictionary
+    """
+    result: Dict[str, Any] = {'ip': ip}
+    
+    for key, regex in _FIELD_PATTERNS:
+        # Later lines win (e.g. the more specific network in ARIN output)
+        match = None
+        for match in regex.finditer(output):
+            pass
+        if match:
+            result[key] = next(group for group in match.groups() if group is not None).strip()
+    
+    return result
+
+
+def referral_block(ip: str) -> str:
+    """
+    Get the IANA allocation block an IP falls in, as used for referral caching.
+    
+    Args:
+        ip: IP address
+        
+    Returns:
+        The enclosing /8 (IPv4) or /32 (IPv6), e.g. '8.0.0.0/8'
+    """
+    return str(ipaddress.ip_network(f"{ip}/{8 if ':' not in ip else 32}", strict=False))
+
+
+def cached_whois_server(ip: str) -> Optional[str]:
+    """
+    Get the WHOIS server IANA named for an IP's block, if we've asked before.
+    
+    Args:
+        ip: IP address
+        
+    Returns:
+        WHOIS server hostname, or None if IANA still needs asking
+    """
+    return _referral_cache.get(referral_block(ip))
+
+
+def remember_whois_server(ip: str, iana_output: str) -> str:
+    """
+    Pick the WHOIS server out of IANA's answer and remember it for the block.
+    
+    Args:
+        ip: IP address IANA was asked about
+        iana_output: IANA's response
+        
+    Returns:
+        WHOIS server hostname (DEFAULT_WHOIS_SERVER if IANA didn't name one)
+    """
+    match = _REFER_RE.search(iana_output)
+    server = match.group(1) if match else DEFAULT_WHOIS_SERVER
+    _referral_cache[referral_block(ip)] = server
+    return server
+
+
+def whois_query(server: str, ip: str) -> str:
+    """
+    Build the query string to send to a WHOIS server for an IP.
+    
+    Args:
+        server: WHOIS server hostname
+        ip: IP address
+        
+    Returns:
+        Query string, in the server's special syntax if it has one
+    """
+    return WHOIS_QUERY_FORMATS.get(server, '{ip}').format(ip=ip)
+
+
+def arin_referral(server: str, output: str) -> Optional[str]:
+    """
+    Find the registry ARIN handed an IP's space over to, if any.
+    
+    Only one hop is worth following - ARIN only ever points at another RIR.
+    
+    Args:
+        server: WHOIS server that gave the answer
+        output: Its response
+        
+    Returns:
+        The whois:// server to ask instead, or None
+    """
+    match = _ARIN_REFERRAL_RE.search(output)
+    if match and match.group(1).lower() != server:
+        return match.group(1).lower()
+    return None
+
+
+def check_whois_response(server: str, output: str, pool: Optional[WhoisServerPool] = None) -> str:
+    """
+    Make sure a WHOIS server actually answered, and note it in the pool.
+    
+    Args:
+        server: WHOIS server hostname
+        output: Its response
+        pool: Connection pool tracking the server's backoff (None for the shared one)
+        
+    Returns:
+        The response, unchanged
+        
+    Raises:
+        TransientLookupError: If the server is rate limiting us
+    """
+    pool = pool or default_pool
+    if is_rate_limit_response(output):
+        pool.report_pushback(server)
+        raise TransientLookupError(f"{server} says query rate limit exceeded")
+    
+    pool.report_success(server)
+    return output
+
+
+def query_whois_server(
+    server: str,
+    query: str,
+    timeout: Optional[float] = None,
+    pool: Optional[WhoisServerPool] = None,
+    limiter: Optional[ServerRateLimiter] = None
+) -> str:
+    """
+    Send a single query to a WHOIS server on port 43 and read the answer.
+    
+    Args:
+        server: WHOIS server hostname
+        query: Query string to send
+        timeout: Timeout in seconds (None for default)
+        pool: Connection pool to go through (None for the shared one)
+        limiter: Optional per-server rate limiter to take a token from first
+        
+    Returns:
+        The server's response as text
+        
+    Raises:
+        TransientLookupError: If the server can't be reached, times out or
+            is rate limiting us
+    """
+    timeout = timeout or DEFAULT_TIMEOUT
+    pool = pool or default_pool
+    chunks = []
+    
+    if limiter is not None:
+        limiter.wait(server)
+    
+    try:
+        with pool.connect(server, WHOIS_PORT, timeout) as sock:
+            sock.sendall(f"{query}\r\n".encode())
+            # The server closes the connection once it's said everything
+            while True:
+                chunk = sock.recv(WHOIS_RECV_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except socket.timeout:
+        raise TransientLookupError(f"Timeout expired for whois query to {server}")
+    except OSError as e:
+        if is_pushback_error(e):
+            pool.report_pushback(server)
+        raise TransientLookupError(f"Error querying {server}: {e}")
+    
+    output = b''.join(chunks).decode('utf-8', errors='replace')
+    return check_whois_response(server, output, pool)
+
+
+def whois_server_for(
+    ip: str,
+    timeout: Optional[float] = None,
+    limiter: Optional[ServerRateLimiter] = None
+) -> str:
+    """
+    Find the WHOIS server for an IP, asking IANA only once per block.
+    
+    Args:
+        ip: IP address
+        timeout: Timeout in seconds (None for default)
+        limiter: Optional per-server rate limiter for the IANA query
+        
+    Returns:
+        WHOIS server hostname
+    """
+    server = cached_whois_server(ip)
+    if server is not None:
+        return server
+    
+    return remember_whois_server(ip, query_whois_server(IANA_WHOIS_SERVER, ip, timeout, limiter=limiter))
+
 
 class SystemWhoisResolver(BaseResolver):
     """
-    WHOIS resolver implementation using the system whois command.
+    WHOIS resolver implementation using plain port 43 WHOIS.
     
-    This resolver uses the system's whois command to look up information
-    for IP addresses. It's used as a fallback when other methods fail.
+    This resolver queries the RIR WHOIS servers directly over TCP - no
+    process per lookup. Pass whois_path to run the system's whois command
+    instead. It's used as a fallback when other methods fail.
     """
     
-    def __init__(self, rate_limit: float = 2.0, whois_path: str = '/usr/bin/whois'):
+    def __init__(
+        self,
+        rate_limit: float = 2.0,
+        whois_path: Optional[str] = None,
+        limiter: Optional[ServerRateLimiter] = None,
+        session: Optional[requests.Session] = None
+    ):
         """
         Initialize the System WHOIS resolver.
         
         Args:
-            rate_limit: Minimum time between requests in seconds (default: 2.0)
-            whois_path: Path to the whois command (default: /usr/bin/whois)
+            rate_limit: Average time between requests in seconds (default: 2.0)
+            whois_path: Path to a whois command to run instead of querying
+                servers directly (default: None)
+            limiter: Shared per-server rate limiter (replaces rate_limit when set)
+            session: Shared HTTP session (unused - WHOIS isn't HTTP)
         """
-        super().__init__(rate_limit)
+        super().__init__(rate_limit, limiter, session)
         self.whois_path = whois_path
         self.name = "SystemWhoisResolver"
-        logger.debug(f"Initialized {self.name} with whois path: {whois_path}")
+        logger.debug("Initialized %s with whois path: %s", self.name, whois_path or '(native client)')
+    
+    def _cache_config(self) -> Tuple[Any, ...]:
+        """The whois command and the native client parse different output"""
+        return (self.whois_path,)
+    
+    def _rate_limit_key(self) -> Optional[str]:
+        """The native client takes a token per server it queries, the whois command can't"""
+        return self.name if self.whois_path else None
     
     def _parse_whois_output(self, output: str, ip: str) -> Dict[str, Any]:
         """
@@ -49,49 +343,7 @@ class SystemWhoisResolver(BaseResolver):
         Returns:
             Parsed WHOIS data as a dictionary
         """
-        result: Dict[str, Any] = {'ip': ip}
-        
-        # Regular expressions for key information
-        patterns = {
-            'organization': [
-                r'(?:Organization|Org(?:anization)? Name):\s*(.+)$',
-                r'(?:descr|owner):\s*(.+)$'
-            ],
-            'country': [
-                r'(?:Country|Country Code):\s*(.+)$',
-                r'country:\s*(.+)$'
-            ],
-            'asn': [
-                r'(?:OriginAS|Origin AS|ASNumber|ASN):\s*(.+)$',
-                r'origin:\s*AS(\d+)$'
-            ],
-            'network': [
-                r'(?:CIDR|NetRange|Network):\s*(.+)$',
-                r'inetnum:\s*(.+)$'
-            ],
-            'registered': [
-                r'(?:RegDate|Created|Registration Date):\s*(.+)$',
-                r'created:\s*(.+)$'
-            ]
-        }
-        
-        # Process each line and extract information
-        for line in output.splitlines():
-            line = line.strip()
-            
-            # Skip empty lines and comments
-            if not line or line.startswith('%') or line.startswith('#'):
-                continue
-            
-            # Process each pattern and extract data
-            for key, pattern_list in patterns.items():
-                for pattern in pattern_list:
-                    match = re.search(pattern, line, re.IGNORECASE)
-                    if match:
-                        result[key] = match.group(1).strip()
-                        break
-        
-        return result
+        return parse_whois_output(output, ip)
     
     def _execute_whois_command(self, ip: str, timeout: Optional[float] = None) -> Tuple[str, int]:
         """
@@ -113,7 +365,7 @@ class SystemWhoisResolver(BaseResolver):
             timeout_val = timeout if timeout is not None else 30
             
             # Execute command
-            logger.debug(f"Executing: {' '.join(cmd)}")
+            logger.debug("Executing: %s", ' '.join(cmd))
             result = subprocess.run(
                 cmd,
                 capture_output=True,
@@ -125,15 +377,40 @@ class SystemWhoisResolver(BaseResolver):
             return result.stdout, result.returncode
             
         except subprocess.TimeoutExpired:
-            logger.error(f"Timeout expired for whois {ip}")
-            raise ValueError(f"Timeout expired for whois command")
+            logger.error("Timeout expired for whois %s", ip)
+            raise TransientLookupError("Timeout expired for whois command")
         except subprocess.SubprocessError as e:
-            logger.error(f"Subprocess error for whois {ip}: {e}")
+            logger.error("Subprocess error for whois %s: %s", ip, e)
             raise ValueError(f"Error executing whois command: {e}")
     
+    def _query_native(self, ip: str, timeout: Optional[float] = None) -> str:
+        """
+        Query the authoritative RIR server directly.
+        
+        Args:
+            ip: IP address to look up
+            timeout: Timeout in seconds (None for default)
+            
+        Returns:
+            Raw WHOIS output
+        """
+        # Every hop (IANA, the RIR, ARIN's referral) takes its own token
+        # from that server's bucket
+        limiter = self._rate_limiter()
+        server = whois_server_for(ip, timeout, limiter)
+        logger.debug("Querying %s for %s", server, ip)
+        output = query_whois_server(server, whois_query(server, ip), timeout, limiter=limiter)
+        
+        referred = arin_referral(server, output)
+        if referred:
+            logger.debug("%s referred %s to %s", server, ip, referred)
+            output = query_whois_server(referred, whois_query(referred, ip), timeout, limiter=limiter)
+        
+        return output
+    
     def _perform_lookup(self, ip: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """
-        Perform the WHOIS lookup using the system whois command.
+        Perform the WHOIS lookup over port 43 (or with the whois command).
         
         Args:
             ip: IP address to look up
@@ -146,19 +423,23 @@ class SystemWhoisResolver(BaseResolver):
             ValueError: If lookup fails
         """
         try:
-            # Execute the whois command
-            output, return_code = self._execute_whois_command(ip, timeout)
-            
-            # Check if command was successful
-            if return_code != 0:
-                logger.warning(f"whois command returned non-zero code {return_code} for {ip}")
-                if not output:
-                    raise ValueError(f"whois command failed with code {return_code}")
+            if self.whois_path:
+                # Execute the whois command
+                output, return_code = self._execute_whois_command(ip, timeout)
+                
+                # Check if command was successful
+                if return_code != 0:
+                    logger.warning("whois command returned non-zero code %s for %s", return_code, ip)
+                    if not output:
+                        # Usually the server couldn't be reached - worth another go
+                        raise TransientLookupError(f"whois command failed with code {return_code}")
+            else:
+                output = self._query_native(ip, timeout)
             
             # Check if we got any output
-            if not output:
-                logger.warning(f"No output from whois command for {ip}")
-                raise ValueError("No output from whois command")
+            if not output.strip():
+                logger.warning("No WHOIS output for %s", ip)
+                raise ValueError("No output from whois")
             
             # Parse the output
             result = self._parse_whois_output(output, ip)
@@ -166,14 +447,14 @@ class SystemWhoisResolver(BaseResolver):
             # Add raw output for debugging
             result['raw_output'] = output
             
-            logger.debug(f"Lookup successful for {ip}")
+            logger.debug("Lookup successful for %s", ip)
             return result
             
         except ValueError:
             # Re-raise ValueError
             raise
         except Exception as e:
-            logger.error(f"Unexpected error during lookup for {ip}: {e}")
+            logger.error("Unexpected error during lookup for %s: %s", ip, e)
             raise ValueError(f"Unexpected error during lookup: {e}")
 
 
@@ -0,0 +1,170 @@
+"""
+Per-server connection handling for port 43 WHOIS queries.
+
+WHOIS closes the connection after every answer, so sockets themselves
+can't be reused. What can be shared between lookups to the same server is
+everything around them: the resolved addresses (one DNS lookup per server
+instead of one per query) and how hard the server has been pushing back,
+so workers back off together instead of each hammering it until they get
+blocked.
+"""
+
+import errno
+import logging
+import random
+import re
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..cache import TTLCache
+
+# Get logger
+logger = logging.getLogger('whois_tool.resolvers.whois_pool')
+
+# How long resolved server addresses are reused, in seconds
+ADDRESS_TTL = 300.0
+
+# Most servers we keep addresses for
+MAX_SERVERS = 1024
+
+# Backoff after a server refuses, resets or rate limits us: base * 2**n,
+# jittered, capped
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+# Connection errors that mean "slow down" rather than "gone"
+_PUSHBACK_ERRNOS = {errno.ECONNRESET, errno.ECONNREFUSED}
+
+# What RIRs say when they've had enough of us (RIPE/APNIC/AFRINIC use
+# %ERROR:201, ARIN and LACNIC spell it out)
+_RATE_LIMIT_RE = re.compile(r'^%?\s*(?:ERROR:201|.*query rate limit exceeded)', re.IGNORECASE | re.MULTILINE)
+
+
+def is_rate_limit_response(output: str) -> bool:
+    """
+    Check whether a WHOIS response is a "too many queries" refusal.
+
+    Args:
+        output: Raw WHOIS output
+
+    Returns:
+        True if the server refused to answer because of rate limiting
+    """
+    # Refusals are short - don't scan a whole 100 KB record for one
+    return len(output) < 4096 and _RATE_LIMIT_RE.search(output) is not None
+
+
+def is_pushback_error(error: OSError) -> bool:
+    """
+    Check whether a socket error means the server wants us to slow down.
+
+    Args:
+        error: Error raised while talking to the server
+
+    Returns:
+        True for resets and refusals
+    """
+    return error.errno in _PUSHBACK_ERRNOS
+
+
+class WhoisServerPool:
+    """
+    Shared state for talking to WHOIS servers: cached addresses and backoff.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, address_ttl: float = ADDRESS_TTL):
+        """
+        Initialize the pool.
+
+        Args:
+            address_ttl: How long to reuse a server's resolved addresses
+        """
+        self.address_ttl = address_ttl
+        self._addresses = TTLCache(MAX_SERVERS)
+        # server -> (consecutive failures, don't connect before this monotonic time)
+        self._backoff: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, server: str, port: int) -> List[tuple]:
+        """Get (and remember) the addresses to connect to for a server"""
+        addresses = self._addresses.get((server, port))
+        if addresses is None:
+            addresses = socket.getaddrinfo(server, port, type=socket.SOCK_STREAM)
+            self._addresses.set((server, port), addresses, self.address_ttl)
+        return addresses
+
+    def backoff_delay(self, server: str) -> float:
+        """
+        Get how long to wait before the next query to server.
+
+        Args:
+            server: WHOIS server hostname
+
+        Returns:
+            Seconds left in the server's backoff period (0 if there's none)
+        """
+        with self._lock:
+            _, not_before = self._backoff.get(server, (0, 0.0))
+        return max(0.0, not_before - time.monotonic())
+
+    def _wait_for_backoff(self, server: str) -> None:
+        """Sleep until the server's backoff period is over"""
+        delay = self.backoff_delay(server)
+        if delay > 0:
+            logger.debug(f"Backing off {server} for {delay:.2f}s")
+            time.sleep(delay)
+
+    def connect(self, server: str, port: int = 43, timeout: Optional[float] = None) -> socket.socket:
+        """
+        Open a connection to a WHOIS server, honouring any backoff.
+
+        Args:
+            server: WHOIS server hostname
+            port: TCP port
+            timeout: Timeout in seconds for connecting and for each read
+
+        Returns:
+            A connected socket
+
+        Raises:
+            OSError: If no address could be connected to
+        """
+        self._wait_for_backoff(server)
+
+        last_error: Optional[OSError] = None
+        for family, socktype, proto, _, sockaddr in self._resolve(server, port):
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+
+        # Nothing worked - maybe the addresses are stale
+        self._addresses.pop((server, port))
+        raise last_error or OSError(f"No addresses for {server}")
+
+    def report_success(self, server: str) -> None:
+        """Note that a query to server worked, ending any backoff"""
+        if server in self._backoff:
+            with self._lock:
+                self._backoff.pop(server, None)
+
+    def report_pushback(self, server: str) -> None:
+        """Note that server refused, reset or rate limited us, and back off"""
+        with self._lock:
+            failures, _ = self._backoff.get(server, (0, 0.0))
+            failures += 1
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** failures) * random.uniform(0.5, 1.5))
+            self._backoff[server] = (failures, time.monotonic() + delay)
+        logger.warning(f"{server} is pushing back, waiting {delay:.1f}s before the next query")
+
+
+# Shared by every SystemWhoisResolver in the process, and the async engine
+default_pool = WhoisServerPool()
@@ -5,11 +5,22 @@ This module provides utility functions for IP validation and data normalization.
 """
 
 import ipaddress
+import json
 import re
+import socket
 import logging
-from typing import Dict, Any, Union, Optional, TypeVar, cast, List
+from functools import lru_cache
+from typing import Dict, Any, Union, Optional, TypeVar, cast, List, Iterable, Iterator
 from datetime import datetime
 
+# orjson encodes and decodes in C - several times faster than json on big
+# nested WHOIS dicts. Optional (pip install .[fast]); used whenever it's
+# installed, and the json fallback writes the same thing.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Get logger
 logger = logging.getLogger('whois_tool.util')
 
@@ -18,6 +29,33 @@ IPAddress = TypeVar('IPAddress', ipaddress.IPv4Address, ipaddress.IPv6Address)
 IPNetwork = TypeVar('IPNetwork', ipaddress.IPv4Network, ipaddress.IPv6Network)
 WhoisResult = Dict[str, Any]
 
+# Fields every normalized result has, apart from 'raw'
+RESULT_FIELDS = ('ip', 'network', 'asn', 'organization', 'country', 'city', 'registered', 'source')
+
+# Parsed IPs are cached - the same address gets validated by the CLI, the
+# engine and every resolver in the fallback chain
+PARSE_IP_CACHE_SIZE = 65536
+
+# First 'AS<digits>' anywhere in the string, otherwise the first run of digits
+_ASN_RE = re.compile(r'(?:.*?AS(\d+)|\D*(\d+))', re.DOTALL)
+
+
+@lru_cache(maxsize=PARSE_IP_CACHE_SIZE)
+def parse_ip(ip_str: str) -> IPAddress:
+    """
+    Parse a string into an IP address object, remembering recent results.
+    
+    Args:
+        ip_str: A string representing an IP address (IPv4 or IPv6)
+        
+    Returns:
+        An IPv4Address or IPv6Address object
+        
+    Raises:
+        ValueError: If the string is not a valid IP address
+    """
+    return cast(IPAddress, ipaddress.ip_address(ip_str))
+
 
 def validate_ip(ip_str: str) -> IPAddress:
     """
@@ -34,10 +72,9 @@ def validate_ip(ip_str: str) -> IPAddress:
     """
     try:
         # Try to create an IP address object
-        ip_obj = ipaddress.ip_address(ip_str)
-        return cast(IPAddress, ip_obj)
+        return parse_ip(ip_str)
     except ValueError:
-        logger.error(f"Invalid IP address: {ip_str}")
+        logger.error("Invalid IP address: %s", ip_str)
         raise ValueError(f"Invalid IP address: {ip_str}")
 
 
@@ -51,13 +88,83 @@ def is_valid_ip(ip_str: str) -> bool:
     Returns:
         True if the string is a valid IP address, False otherwise
     """
+    # inet_pton is a single C call and just as strict as ipaddress (no
+    # leading zeros, no short forms) - much cheaper than building an
+    # address object for millions of lines. Scoped IPv6 ('fe80::1%eth0')
+    # and non-strings still go through ipaddress.
+    if isinstance(ip_str, str) and '%' not in ip_str:
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in ip_str else socket.AF_INET, ip_str)
+            return True
+        except (OSError, ValueError):
+            return False
+    
     try:
-        validate_ip(ip_str)
+        parse_ip(ip_str)
         return True
     except ValueError:
         return False
 
 
+def is_public_ip(ip_str: str) -> bool:
+    """
+    Check if an IP address is one the registries could know about.
+    
+    Private, loopback, link-local, shared (CGNAT), multicast and reserved
+    addresses all come back False.
+    
+    Args:
+        ip_str: A string representing an IP address
+        
+    Returns:
+        True if the address is globally routable unicast, False otherwise
+        
+    Raises:
+        ValueError: If the string is not a valid IP address
+    """
+    addr = validate_ip(ip_str)
+    return addr.is_global and not (addr.is_multicast or addr.is_reserved)
+
+
+def canonical_ip(ip_str: str) -> Optional[str]:
+    """
+    Convert an IP address string to its canonical (compressed) form.
+    
+    This makes e.g. '2001:DB8::1' and '2001:db8:0:0:0:0:0:1' the same key.
+    
+    Args:
+        ip_str: A string that may be an IP address
+        
+    Returns:
+        The compressed IP address string, or None if it isn't a valid IP
+    """
+    try:
+        return str(parse_ip(ip_str))
+    except ValueError:
+        return None
+
+
+def iter_unique_ips(ip_iter: Iterable[str]) -> Iterator[str]:
+    """
+    Yield each valid IP address once, in canonical form.
+    
+    Invalid entries are dropped silently - callers that want to report
+    them should check with canonical_ip first.
+    
+    Args:
+        ip_iter: IP address strings (any iterable, consumed lazily)
+        
+    Yields:
+        Unique, valid, canonical IP address strings in input order
+    """
+    seen = set()
+    for ip in ip_iter:
+        canonical = canonical_ip(ip)
+        if canonical is not None and canonical not in seen:
+            seen.add(canonical)
+            yield canonical
+
+
 def extract_asn(asn_str: Optional[str]) -> Optional[str]:
     """
     Extract the ASN number from an ASN string.
@@ -70,20 +177,10 @@ def extract_asn(asn_str: Optional[str]) -> Optional[str]:
     """
     if not asn_str:
         return None
-        
-    # Pattern to match ASN number (AS followed by digits)
-    pattern = r'AS(\d+)'
-    match = re.search(pattern, str(asn_str))
     
-    if match:
-        return match.group(1)
-    
-    # If no match but there are digits, extract them
-    digits = re.search(r'(\d+)', str(asn_str))
-    if digits:
-        return digits.group(1)
-        
-    return None
+    # One pass instead of two searches - see _ASN_RE
+    match = _ASN_RE.match(str(asn_str))
+    return (match.group(1) or match.group(2)) if match else None
 
 
 def extract_organization(org_data: Optional[Union[str, Dict[str, Any]]]) -> Optional[str]:
@@ -162,6 +259,50 @@ def extract_city(location_data: Optional[Union[str, Dict[str, Any]]]) -> Optiona
     return None
 
 
+# Non-ISO date formats registries use (RIPE/LACNIC, JPNIC, old InterNIC
+# style...). ISO 8601 goes through fromisoformat first.
+_TIMESTAMP_FORMATS = ('%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d', '%d-%b-%Y', '%Y%m%d%H%M%S')
+
+# Whichever of those matched last - batches tend to come from one registry,
+# so it's usually right
+_last_timestamp_format = _TIMESTAMP_FORMATS[0]
+
+
+def _parse_timestamp_string(timestamp: str) -> datetime:
+    """
+    Parse a date string in any of the formats registries use.
+    
+    Args:
+        timestamp: Date string
+        
+    Returns:
+        The parsed datetime
+        
+    Raises:
+        ValueError: If no known format matches
+    """
+    global _last_timestamp_format
+    
+    timestamp = timestamp.strip()
+    
+    # Older fromisoformat doesn't understand 'Z'
+    iso = timestamp[:-1] + '+00:00' if timestamp.endswith('Z') else timestamp
+    try:
+        return datetime.fromisoformat(iso)
+    except ValueError:
+        pass
+    
+    for fmt in (_last_timestamp_format,) + _TIMESTAMP_FORMATS:
+        try:
+            dt = datetime.strptime(timestamp, fmt)
+        except ValueError:
+            continue
+        _last_timestamp_format = fmt
+        return dt
+    
+    raise ValueError(f"Unknown timestamp format: {timestamp}")
+
+
 def format_timestamp(timestamp: Optional[Union[str, int, float, datetime]]) -> Optional[str]:
     """
     Format a timestamp to a consistent string format.
@@ -179,12 +320,7 @@ def format_timestamp(timestamp: Optional[Union[str, int, float, datetime]]) -> O
         if isinstance(timestamp, (int, float)):
             dt = datetime.fromtimestamp(timestamp)
         elif isinstance(timestamp, str):
-            # Try parsing as ISO format first
-            try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            except ValueError:
-                # If that fails, try a common format
-                dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+            dt = _parse_timestamp_string(timestamp)
         elif isinstance(timestamp, datetime):
             dt = timestamp
         else:
@@ -192,11 +328,22 @@ def format_timestamp(timestamp: Optional[Union[str, int, float, datetime]]) -> O
             
         return dt.strftime("%Y-%m-%d %H:%M:%S")
     except Exception as e:
-        logger.debug(f"Error formatting timestamp {timestamp}: {e}")
+        logger.debug("Error formatting timestamp %s: %s", timestamp, e)
         # If we can't parse it, return as is
         return str(timestamp) if timestamp else None
 
 
+# Normalized field -> (raw keys to try, in order, and how to clean the value
+# up). The first key present in the raw result wins.
+_FIELD_EXTRACTORS = (
+    ('asn', ('asn',), lambda value: extract_asn(str(value))),
+    ('organization', ('org', 'organization'), extract_organization),
+    ('country', ('country', 'asn_country_code'), extract_country),
+    ('city', ('city',), extract_city),
+    ('registered', ('registered', 'created'), format_timestamp),
+)
+
+
 def normalize_whois_result(raw_result: Dict[str, Any], source: str) -> WhoisResult:
     """
     Normalize raw WHOIS lookup results to a consistent format.
@@ -235,41 +382,30 @@ def normalize_whois_result(raw_result: Dict[str, Any], source: str) -> WhoisResu
     elif 'cidr' in raw_result:
         result['network'] = raw_result['cidr']
         
-    # Extract ASN
-    if 'asn' in raw_result:
-        result['asn'] = extract_asn(str(raw_result['asn']))
-    elif 'asn_registry' in raw_result and 'asn' in raw_result:
-        result['asn'] = extract_asn(str(raw_result['asn']))
-        
-    # Extract organization
-    if 'org' in raw_result:
-        result['organization'] = extract_organization(raw_result['org'])
-    elif 'organization' in raw_result:
-        result['organization'] = extract_organization(raw_result['organization'])
-    elif 'nets' in raw_result and raw_result['nets'] and isinstance(raw_result['nets'], list):
-        for net in raw_result['nets']:
-            if 'description' in net:
-                result['organization'] = extract_organization(net['description'])
+    # Extract the simple fields
+    for field, keys, extract in _FIELD_EXTRACTORS:
+        for key in keys:
+            if key in raw_result:
+                result[field] = extract(raw_result[key])
                 break
-                
-    # Extract location
-    if 'country' in raw_result:
-        result['country'] = extract_country(raw_result['country'])
-    elif 'asn_country_code' in raw_result:
-        result['country'] = extract_country(raw_result['asn_country_code'])
-    
-    if 'city' in raw_result:
-        result['city'] = extract_city(raw_result['city'])
-        
-    # Extract registration date
-    if 'registered' in raw_result:
-        result['registered'] = format_timestamp(raw_result['registered'])
-    elif 'created' in raw_result:
-        result['registered'] = format_timestamp(raw_result['created'])
+    
+    # ipwhois only has the organization in its nets' descriptions
+    if 'org' not in raw_result and 'organization' not in raw_result:
+        nets = raw_result.get('nets')
+        if nets and isinstance(nets, list):
+            for net in nets:
+                if 'description' in net:
+                    result['organization'] = extract_organization(net['description'])
+                    break
     
     return result
 
 
+# Fields merge_whois_results fills in from other results - source gets
+# joined instead, and raw always comes from the first result
+_MERGE_FIELDS = tuple(field for field in RESULT_FIELDS if field != 'source')
+
+
 def merge_whois_results(results: List[WhoisResult]) -> WhoisResult:
     """
     Merge multiple WHOIS results into a single result.
@@ -288,26 +424,21 @@ def merge_whois_results(results: List[WhoisResult]) -> WhoisResult:
     
     # Use the first result as the base
     merged = results[0].copy()
+    others = results[1:]
     
-    # Track sources
-    sources = [merged.get('source', 'unknown')]
+    # Fill each empty field from the first later result that has it - one
+    # pass per field instead of re-checking every key of every result
+    for field in _MERGE_FIELDS:
+        if merged.get(field):
+            continue
+        for result in others:
+            value = result.get(field)
+            if value:
+                merged[field] = value
+                break
     
-    # Merge additional results
-    for result in results[1:]:
-        sources.append(result.get('source', 'unknown'))
-        
-        # Merge each field, preferring non-None values
-        for key, value in result.items():
-            # Skip source and raw fields
-            if key in ('source', 'raw'):
-                continue
-                
-            # Use the new value if the current value is None or empty
-            if merged.get(key) is None or (merged.get(key) == '' and value):
-                merged[key] = value
-    
-    # Update the source field
-    merged['source'] = ', '.join(sources)
+    # Track sources
+    merged['source'] = ', '.join(result.get('source', 'unknown') for result in results)
     
     return merged
 
@@ -323,11 +454,75 @@ def filter_valid_ips(ip_list: List[str]) -> List[str]:
         List of valid IP addresses
     """
     valid_ips = []
+    append = valid_ips.append
     
     for ip in ip_list:
         if is_valid_ip(ip):
-            valid_ips.append(ip)
+            append(ip)
         else:
-            logger.warning(f"Skipping invalid IP address: {ip}")
+            logger.warning("Skipping invalid IP address: %s", ip)
     
     return valid_ips
+
+
+def _json_default(obj: Any) -> str:
+    """Encode what JSON has no type for the way orjson does: ISO 8601 dates, else str()"""
+    return obj.isoformat() if hasattr(obj, 'isoformat') else str(obj)
+
+
+def _stringify_keys(obj: Any) -> Any:
+    """Copy of obj with every dict key json can't take turned into a string"""
+    if isinstance(obj, dict):
+        return {
+            k if isinstance(k, (str, int, float, bool)) or k is None else _json_default(k): _stringify_keys(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, (list, tuple)):
+        return [_stringify_keys(v) for v in obj]
+    return obj
+
+
+def json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize an object to JSON, with orjson if it's available.
+    
+    Datetimes come out in ISO 8601 and anything else JSON has no type for
+    (sets...) as its str(). Non-string dict keys are turned into strings.
+    The output is the same with or without orjson.
+    
+    Args:
+        obj: Object to serialize
+        indent: Pretty-print with two-space indents
+        
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_json_default, option=option)
+    # Same bytes orjson would write: compact separators, UTF-8 left as-is
+    dump_kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+    try:
+        text = json.dumps(obj, default=_json_default, ensure_ascii=False, **dump_kwargs)
+    except TypeError:
+        # json only takes str/int/float/bool/None keys - orjson takes more
+        text = json.dumps(_stringify_keys(obj), default=_json_default, ensure_ascii=False, **dump_kwargs)
+    return text.encode('utf-8')
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse JSON, with orjson if it's available.
+    
+    Args:
+        data: JSON text
+        
+    Returns:
+        The decoded object
+        
+    Raises:
+        ValueError: If data isn't valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)